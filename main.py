@@ -1,14 +1,64 @@
 import sys
 import os
+import argparse
+import multiprocessing
 # Ensure src is in sys.path for import
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.gui import MojiOkoshiGUI
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="mojiokoshi")
+    commands = parser.add_subparsers(dest="command")
+    resume = commands.add_parser("resume", help="途中で終了したセッションの文字起こしを録音ファイルから再開する")
+    resume.add_argument("journal", nargs="?", help="log/voice/ のジャーナル (*.journal.jsonl)。省略時は最新のもの")
+    resume.add_argument("--title", help="結合シナリオのファイル名（省略時はジャーナル名）")
+    transcribe = commands.add_parser("transcribe", help="録音ファイル (WAV) を GUI なしで文字起こしする")
+    transcribe.add_argument("files", nargs="+", help="文字起こしする WAV ファイル（log/voice/*.wav など）")
+    transcribe.add_argument("--workers", type=int, help="並列に処理するプロセス数（省略時はコア数から決める）")
+    transcribe.add_argument("--output-dir", help="シーンごとの出力先（省略時は log/output/<ファイル名>/）")
+    transcribe.add_argument("--scenario-dir", help="結合シナリオの出力先（省略時は log/scenario_log/）")
+    bench = commands.add_parser("bench", help="マイクなしで各処理段階のベンチマークを実行し、結果を JSON で出力する")
+    bench.add_argument("--output", help="結果の保存先（省略時は標準出力）")
+    bench.add_argument("--seconds", type=float, default=60.0, help="合成音声の長さ（秒）")
+    bench.add_argument("--stub-delay", type=float, default=0.05, help="スタブのモデルの音声1秒あたりの遅延（秒）")
+    bench.add_argument("--model", help="スタブの代わりに使うモデルサイズ（tiny など）")
+    daemon = commands.add_parser("daemon", help="GUI なしで録音・文字起こしを行い、コマンドを標準入力または TCP ポートで受け付ける")
+    daemon.add_argument("--config", help="設定ファイル (TOML)。src/mojiokoshi.py の設定項目を上書きする")
+    daemon.add_argument("--port", type=int, help="コマンドを受け付けるポート（127.0.0.1 のみ、省略時は標準入力）")
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+    if args.command == "resume":
+        from resume import resume_session, find_latest_journal
+        journal = args.journal or find_latest_journal()
+        if journal is None:
+            sys.exit("再開できるジャーナルが見つかりません。")
+        resume_session(journal, title=args.title)
+        return
+    if args.command == "transcribe":
+        from offline import transcribe_files
+        reports = transcribe_files(args.files, workers=args.workers,
+                                   output_dir=args.output_dir, scenario_dir=args.scenario_dir)
+        if len(reports) < len(args.files):
+            sys.exit(1)
+        return
+
+    if args.command == "bench":
+        from benchmark import main as run_benchmark
+        run_benchmark(args.output, seconds=args.seconds, stub_delay=args.stub_delay, model=args.model)
+        return
+
+    if args.command == "daemon":
+        from headless import main as run_headless
+        run_headless(config=args.config, port=args.port)
+        return
+
+    from src.gui import MojiOkoshiGUI
     # GUIクラスを生成して mainloop を実行
     app = MojiOkoshiGUI()
     app.run()  # run() 内で root.mainloop() を呼ぶ想定
 
 if __name__ == "__main__":
+    # PyInstaller でまとめた場合でも文字起こしワーカープロセスを起動できるようにする
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+処理速度に合わせたモデルの切り替え。
+
+区間ごとの実時間比（文字起こし時間 ÷ 音声の長さ）とキューの伸びを見て、
+追いつけなければ小さいモデルに、余裕があれば大きいモデルに切り替える。
+切り替え先のモデルはメモリの予算内なら裏で読み込んでおき、入らない場合は切り替え時に読み込む。
+読み込みに失敗したモデルには以後切り替えない。
+"""
+import gc
+import threading
+
+# モデルの大きさごとのおおよそのメモリ使用量 (MB)。名前の先頭で引く（"large-v3" -> "large"）
+MODEL_MEMORY_MB = {
+    "tiny": 200,
+    "base": 400,
+    "small": 1200,
+    "medium": 3000,
+    "large": 6000,
+    "turbo": 3200,
+}
+
+
+class ModelTier:
+    """
+    切り替え候補のモデル。
+    spec はモデルの大きさ（"small" など、既定のエンジンで読み込む）か、
+    {'backend': エンジン名, 'model': 大きさ, 'options': エンジンの設定, 'name': 表示名, 'memory_mb': メモリ使用量} の辞書
+    """
+
+    def __init__(self, spec, backend, options):
+        if isinstance(spec, str):
+            spec = {'model': spec}
+        self.model = spec['model']
+        self.backend = spec.get('backend', backend)
+        self.options = dict(spec['options']) if 'options' in spec else dict(options)
+        self.name = spec.get('name') or self._default_name(backend)
+        self.memory_mb = spec.get('memory_mb') or self._estimate_memory()
+
+    def _default_name(self, default_backend):
+        extra = [] if self.backend == default_backend else [self.backend]
+        if 'compute_type' in self.options:
+            extra.append(self.options['compute_type'])
+        return f"{self.model} ({', '.join(extra)})" if extra else self.model
+
+    def _estimate_memory(self):
+        size = next((mb for prefix, mb in MODEL_MEMORY_MB.items() if self.model.startswith(prefix)), 3000)
+        if "int8" in str(self.options.get('compute_type', "")):
+            size //= 2
+        return size
+
+
+class ModelController:
+    """
+    モデルの段階（小さい順の tiers）を、計測した実時間比に合わせて切り替える。
+    - load(tier) は ModelTier からウォームアップ済みのエンジンを作る関数
+    - activate(backend) は使うエンジンを差し替える関数（手放す前には None で呼ぶ）
+    - observe() は文字起こしスレッドから区間の処理ごとに呼ぶ。エンジンの差し替えは observe() の中だけで起こるので、
+      文字起こし中のエンジンが途中で変わることはない
+    - 実時間比が target_rtf を超えるか、キューの待ちが max_latency_sec を超えて伸び続けたら1段小さくする
+    - 大きいモデルの実時間比の見込みが target_rtf の headroom 倍未満で、キューがほぼ空なら1段大きくする
+    - 読み込みに失敗した段階は実時間比を無限大として記録し、以後は読み込みも切り替えもしない
+    """
+
+    def __init__(self, tiers, load, activate, initial=0, target_rtf=0.8, max_latency_sec=30.0, memory_mb=8000,
+                 min_chunks=5, smoothing=0.3, headroom=0.7):
+        self.tiers = tiers
+        self.load = load
+        self.activate = activate
+        self.current = initial
+        self.target_rtf = target_rtf
+        self.max_latency_sec = max_latency_sec
+        self.memory_mb = memory_mb
+        self.min_chunks = min_chunks
+        self.smoothing = smoothing
+        self.headroom = headroom
+
+        self.lock = threading.Lock()
+        self.loaded = {}            # 段階の番号 -> エンジン
+        self.loading = None         # 裏で読み込み中の段階
+        self.rtf = {}               # 段階ごとの実時間比（指数移動平均）
+        self.previous_queued_sec = 0.0
+        self.chunks_since_switch = 0
+        self.switches = []          # (切り替え前, 切り替え後, 理由)
+
+    @property
+    def tier(self):
+        return self.tiers[self.current]
+
+    def start(self):
+        """最初の段階を読み込み（呼び出したスレッドで待つ）、1段小さいモデルを予算内なら裏で読み込んでおく"""
+        self.loaded[self.current] = self.load(self.tier)
+        self.activate(self.loaded[self.current])
+        self.preload(self.current - 1)
+
+    def observe(self, processing_sec, audio_sec, queued_sec):
+        """
+        区間（またはまとめて処理した区間）の処理時間と音声の長さ、処理後のキューの待ち秒数を記録する。
+        モデルを切り替えた場合は True を返す
+        """
+        if audio_sec <= 0:
+            return False
+        rtf = processing_sec / audio_sec
+        previous = self.rtf.get(self.current)
+        self.rtf[self.current] = rtf if previous is None else previous + self.smoothing * (rtf - previous)
+        growing = queued_sec > self.previous_queued_sec
+        self.previous_queued_sec = queued_sec
+        self.chunks_since_switch += 1
+        if self.chunks_since_switch < self.min_chunks:
+            return False
+
+        measured = self.rtf[self.current]
+        if self.current > 0 and (measured > self.target_rtf or (queued_sec > self.max_latency_sec and growing)):
+            return self._switch(self.current - 1, f"実時間比 {measured:.2f}, 待ち {queued_sec:.0f}秒")
+        if (self.current + 1 < len(self.tiers) and queued_sec < self.max_latency_sec / 4
+                and self.predicted_rtf(self.current + 1) < self.target_rtf * self.headroom):
+            return self._switch(self.current + 1, f"実時間比 {measured:.2f}")
+        return False
+
+    def predicted_rtf(self, index):
+        """段階の実時間比の見込み（計測済みならその値、なければメモリ使用量の比で現在の値から推定）"""
+        if index in self.rtf:
+            return self.rtf[index]
+        return self.rtf[self.current] * self.tiers[index].memory_mb / self.tier.memory_mb
+
+    def preload(self, index):
+        """予算内に収まれば、段階 index のモデルを裏で読み込む"""
+        if not 0 <= index < len(self.tiers):
+            return
+        with self.lock:
+            if index in self.loaded or self.loading is not None or self.failed(index):
+                return
+            if self.tier.memory_mb + self.tiers[index].memory_mb > self.memory_mb:
+                return  # 入らないので切り替え時に読み込む
+            self.loading = index
+            others = [other for other in self.loaded if other != self.current]
+        # 今のモデル以外を手放せば入る場合は手放す
+        for other in others:
+            if self.loaded_memory_mb() + self.tiers[index].memory_mb > self.memory_mb:
+                self._release(other)
+        threading.Thread(target=self._load_background, args=(index,), daemon=True).start()
+
+    def _load_background(self, index):
+        try:
+            backend = self.load(self.tiers[index])
+        except Exception as e:
+            print(f"モデル {self.tiers[index].name} の読み込みに失敗しました（以後このモデルには切り替えません）: {e}")
+            backend = None
+        with self.lock:
+            if backend is not None:
+                self.loaded[index] = backend
+            else:
+                self.rtf[index] = float("inf")
+            self.loading = None
+
+    def failed(self, index):
+        """段階 index のモデルの読み込みに失敗したことがあるか"""
+        return self.rtf.get(index) == float("inf")
+
+    def _switch(self, index, reason):
+        if self.failed(index):
+            return False
+        with self.lock:
+            backend = self.loaded.get(index)
+            loading = self.loading
+        if backend is None:
+            if loading is not None:
+                return False  # 読み込みが終わるまで今のモデルで続ける
+            if self.tier.memory_mb + self.tiers[index].memory_mb <= self.memory_mb:
+                self.preload(index)
+                return False
+            # 予算に2つは入らないので、今のモデル以外を手放してからここで読み込む（その間の音声はキューに溜まる）。
+            # 今のモデルは読み込みが終わるまで使えるように残し、失敗したらそのまま使い続ける
+            print(f"モデルを {self.tier.name} から {self.tiers[index].name} に切り替えるため読み込み中...")
+            for other in list(self.loaded):
+                if other != self.current:
+                    self._release(other)
+            try:
+                backend = self.load(self.tiers[index])
+            except Exception as e:
+                print(f"モデル {self.tiers[index].name} の読み込みに失敗しました（{self.tier.name} を使い続けます）: {e}")
+                self.rtf[index] = float("inf")  # 同じ段階には切り替えない
+                self.chunks_since_switch = 0
+                return False
+            with self.lock:
+                self.loaded[index] = backend
+
+        print(f"モデルを {self.tier.name} から {self.tiers[index].name} に切り替えました ({reason})")
+        self.switches.append((self.tier.name, self.tiers[index].name, reason))
+        self.current = index
+        self.chunks_since_switch = 0
+        self.activate(backend)
+        # 予算を超える分は使っていないモデルから手放し、次の退避先（1段小さいモデル）を用意する
+        for other in sorted(self.loaded, key=lambda i: abs(i - index), reverse=True):
+            if other != index and self.loaded_memory_mb() > self.memory_mb:
+                self._release(other)
+        self.preload(index - 1)
+        return True
+
+    def loaded_memory_mb(self):
+        with self.lock:
+            return sum(self.tiers[index].memory_mb for index in self.loaded)
+
+    def _release(self, index):
+        with self.lock:
+            self.loaded.pop(index, None)
+        gc.collect()
+
+    def stats(self):
+        return {
+            'tier': self.tier.name,
+            'loaded': [self.tiers[index].name for index in sorted(self.loaded)],
+            'loaded_memory_mb': self.loaded_memory_mb(),
+            'rtf': {self.tiers[index].name: value for index, value in self.rtf.items()},
+            'switches': len(self.switches),
+        }
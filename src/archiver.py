@@ -0,0 +1,348 @@
+import collections
+import json
+import os
+import threading
+import time
+import numpy as np
+import soundfile as sf
+from ring_buffer import AudioRingBuffer
+
+# 保存形式: 名前 -> (soundfile の format, subtype, 拡張子)
+ARCHIVE_FORMATS = {
+    "wav": ("WAV", "PCM_16", ".wav"),
+    "flac": ("FLAC", "PCM_16", ".flac"),   # 可逆圧縮
+    "opus": ("OGG", "OPUS", ".opus"),      # 非可逆圧縮（対応するサンプルレートのみ）
+}
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+INDEX_SUFFIX = ".index.json"
+RECOVER_BLOCK_FRAMES = 4096  # 書き込み中に落ちたファイルの長さを調べるときに一度にデコードするフレーム数
+
+
+class AudioArchiver:
+    """
+    録音データのファイル保存を専用スレッドで行う。
+    - audio_callback からは submit() でリングバッファにコピーするだけ
+    - 2チャンネル化 (Mic, Virtual Mono) とエンコード・書き込みはスレッド側で少しずつ行う
+    - 書き込みが追いつかずリングバッファが満杯の場合、そのブロックは破棄して数える
+    - format が "wav" 以外、または segment_sec を指定した場合は segment_sec ごとに別ファイルに分け、
+      各ファイルの開始フレームを書いたシーク用の索引 (<stem>.index.json) を作る。
+      open_archive() で索引を開くと、先頭から読まずに任意の位置から読み出せる
+    path は拡張子を除いたパス。読み出しに使うパス（WAV または索引）は self.path
+    """
+
+    def __init__(self, path, samplerate, input_channels, buffer_sec=30, format="wav", segment_sec=0):
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(f"不明な保存形式です: {format} (選択肢: {', '.join(ARCHIVE_FORMATS)})")
+        if format == "opus" and samplerate not in OPUS_RATES:
+            print(f"⚠️ Opus は {samplerate}Hz に対応していないため FLAC で保存します")
+            format = "flac"
+        self.stem = path
+        self.format = format
+        self.samplerate = samplerate
+        self.segment_frames = int(segment_sec * samplerate)
+        self.indexed = format != "wav" or self.segment_frames > 0
+        self.path = path + (INDEX_SUFFIX if self.indexed else ARCHIVE_FORMATS[format][2])
+        self.ring_buffer = AudioRingBuffer(int(buffer_sec * samplerate), input_channels)
+        self.writer = None
+        self.segments = []        # 索引: [{'file', 'start', 'frames', 'bytes'}]
+        self.segment_start = 0    # 書き込み中のファイルの開始フレーム
+        self.thread = None
+        self._wakeup = threading.Event()
+        self._closing = threading.Event()
+        # 受け付けたブロックの終了位置（スレッド側で書き込み済みになったら取り除く）
+        self._block_ends = collections.deque()
+
+        # 統計情報
+        self.blocks_submitted = 0
+        self.blocks_written = 0
+        self.frames_written = 0
+        self.bytes_written = 0    # 閉じたファイルの実際のサイズの合計
+        self.encode_cpu_sec = 0.0 # 2チャンネル化とエンコード・書き込みにかかった CPU 時間
+        self.dropped_blocks = 0
+        self.dropped_frames = 0
+        self.write_errors = 0
+
+    def start(self):
+        """ファイルを開いて書き込みスレッドを開始"""
+        self._open_segment()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _segment_path(self):
+        extension = ARCHIVE_FORMATS[self.format][2]
+        if not self.indexed:
+            return self.path
+        if not self.segment_frames:
+            return self.stem + extension
+        return f"{self.stem}.{len(self.segments) + 1:04d}{extension}"
+
+    def _open_segment(self):
+        major, subtype, _ = ARCHIVE_FORMATS[self.format]
+        segment_path = self._segment_path()
+        # 保存するファイルは 2 チャンネルで作成
+        self.writer = sf.SoundFile(
+            segment_path,
+            mode='w',
+            samplerate=self.samplerate,
+            channels=2,              # 2チャンネル (Mic, Virtual Mono)
+            format=major,
+            subtype=subtype,
+        )
+        self.segment_start = self.frames_written
+        if self.indexed:
+            # 書き込み中のファイルも索引に載せておく（落ちた場合もそこまでは読める）
+            self.segments.append({'file': os.path.basename(segment_path), 'start': self.segment_start,
+                                  'frames': None, 'bytes': None})
+            self._write_index()
+
+    def _close_segment(self):
+        self.writer.close()
+        self.writer = None
+        size = os.path.getsize(self._last_segment_path())
+        self.bytes_written += size
+        if self.indexed:
+            self.segments[-1].update(frames=self.frames_written - self.segment_start, bytes=size)
+            self._write_index()
+
+    def _last_segment_path(self):
+        if not self.indexed:
+            return self.path
+        return os.path.join(os.path.dirname(self.path), self.segments[-1]['file'])
+
+    def _write_index(self):
+        index = {
+            'format': self.format,
+            'samplerate': self.samplerate,
+            'channels': 2,
+            'frames': self.frames_written,
+            'segments': self.segments,
+        }
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(temporary, self.path)
+
+    def submit(self, indata):
+        """
+        録音ブロックを受け付ける（audio_callback から呼ぶ）。
+        空きがなく破棄した場合は False を返す。
+        """
+        frames = indata.shape[0]
+        if frames == 0:
+            return True
+        if self.ring_buffer.write(indata) == 0:
+            self.dropped_blocks += 1
+            self.dropped_frames += frames
+            return False
+        self.blocks_submitted += 1
+        self._block_ends.append(self.ring_buffer.write_position)
+        self._wakeup.set()
+        return True
+
+    def backlog_frames(self):
+        """まだファイルに書き込まれていないフレーム数"""
+        return self.ring_buffer.available()
+
+    def backlog_blocks(self):
+        """まだファイルに書き込まれていないブロック数"""
+        return len(self._block_ends)
+
+    def stats(self):
+        """
+        統計情報を辞書で返す。
+        compression_ratio は 16bit PCM（WAV 相当）のサイズ ÷ 実際のファイルサイズ、
+        cpu_per_audio_sec は録音1秒あたりのエンコード CPU 時間（秒）
+        """
+        bytes_written = self.bytes_written
+        if self.writer is not None:
+            try:
+                bytes_written += os.path.getsize(self._last_segment_path())
+            except OSError:
+                pass
+        pcm_bytes = self.frames_written * 2 * 2
+        audio_sec = self.frames_written / self.samplerate
+        return {
+            'format': self.format,
+            'segments': max(len(self.segments), 1),
+            'blocks_submitted': self.blocks_submitted,
+            'blocks_written': self.blocks_written,
+            'bytes_written': bytes_written,
+            'pcm_bytes': pcm_bytes,
+            'compression_ratio': pcm_bytes / bytes_written if bytes_written else 0.0,
+            'encode_cpu_sec': self.encode_cpu_sec,
+            'cpu_per_audio_sec': self.encode_cpu_sec / audio_sec if audio_sec else 0.0,
+            'backlog_blocks': self.backlog_blocks(),
+            'backlog_frames': self.backlog_frames(),
+            'dropped_blocks': self.dropped_blocks,
+            'dropped_frames': self.dropped_frames,
+            'write_errors': self.write_errors,
+        }
+
+    @staticmethod
+    def to_stereo(view):
+        """Ch 0: マイク音声 (そのまま)、Ch 1 以降: 仮想チャンネルを平均化してモノラルに"""
+        output = np.empty((view.shape[0], 2), dtype=np.float32)
+        output[:, 0] = view[:, 0]
+        if view.shape[1] > 1:
+            np.mean(view[:, 1:], axis=1, out=output[:, 1])
+        else:
+            output[:, 1] = view[:, 0]
+        return output
+
+    def _drain(self):
+        start = self.ring_buffer.read_position
+        end = self.ring_buffer.write_position
+        if end <= start:
+            return
+        cpu_started = time.thread_time()
+        try:
+            for view in self.ring_buffer.views(start, end):
+                self._write(self.to_stereo(view))
+        except Exception as e:
+            self.write_errors += 1
+            print(f"録音ファイルへの書き込みエラー: {e}")
+        finally:
+            self.ring_buffer.release(end)
+            self.encode_cpu_sec += time.thread_time() - cpu_started
+        while self._block_ends and self._block_ends[0] <= end:
+            self._block_ends.popleft()
+            self.blocks_written += 1
+
+    def _write(self, data):
+        """ファイルに書き込む（segment_frames ごとに次のファイルに切り替える）"""
+        while len(data):
+            count = len(data)
+            if self.segment_frames:
+                count = min(count, self.segment_start + self.segment_frames - self.frames_written)
+            self.writer.write(data[:count])
+            self.frames_written += count
+            data = data[count:]
+            if len(data):
+                self._close_segment()
+                self._open_segment()
+
+    def _run(self):
+        while not self._closing.is_set():
+            self._wakeup.wait(timeout=0.5)
+            self._wakeup.clear()
+            self._drain()
+        # 終了時に残りを書き出す
+        self._drain()
+
+    def close(self):
+        """残りを書き出してファイルを閉じる"""
+        self._closing.set()
+        self._wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.writer is not None:
+            self._close_segment()
+        if self.dropped_blocks:
+            print(f"⚠️ 保存が追いつかず破棄したブロック: {self.dropped_blocks} ({self.dropped_frames}フレーム)")
+
+
+class ArchiveReader:
+    """
+    索引付きで保存した録音 (AudioArchiver) を1つのファイルのように読み出す。
+    seek() は索引から該当するファイルを選び、そのファイル内は soundfile のシークを使うので先頭から読まない
+    """
+
+    def __init__(self, index_path):
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        directory = os.path.dirname(index_path)
+        self.samplerate = index['samplerate']
+        self.channels = index['channels']
+        self.segments = []
+        position = 0
+        for segment in index['segments']:
+            path = os.path.join(directory, segment['file'])
+            frames = segment['frames']
+            if frames is None:
+                # 書き込み中に落ちたファイルは、読み出せる長さを調べる
+                frames = readable_frames(path)
+                if not frames:
+                    continue
+            self.segments.append((position, frames, path))
+            position += frames
+        self.frames = position
+        self.position = 0
+        self._current = None   # (番号, SoundFile)
+
+    def seek(self, frame):
+        self.position = min(max(int(frame), 0), self.frames)
+        return self.position
+
+    def read(self, frames=-1, dtype="float64", always_2d=False):
+        if frames < 0:
+            frames = self.frames - self.position
+        parts = []
+        while frames > 0 and self.position < self.frames:
+            number = self._segment_at(self.position)
+            start, length, _ = self.segments[number]
+            file = self._open(number)
+            file.seek(self.position - start)
+            data = file.read(min(frames, start + length - self.position), dtype=dtype, always_2d=True)
+            if not len(data):
+                break
+            parts.append(data)
+            self.position += len(data)
+            frames -= len(data)
+        data = np.concatenate(parts) if parts else np.zeros((0, self.channels), dtype=dtype)
+        return data if always_2d else data.squeeze()
+
+    def _segment_at(self, frame):
+        for number, (start, length, _) in enumerate(self.segments):
+            if frame < start + length:
+                return number
+        return len(self.segments) - 1
+
+    def _open(self, number):
+        if self._current is None or self._current[0] != number:
+            self.close()
+            self._current = (number, sf.SoundFile(self.segments[number][2]))
+        return self._current[1]
+
+    def close(self):
+        if self._current is not None:
+            self._current[1].close()
+            self._current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def readable_frames(path, block=RECOVER_BLOCK_FRAMES):
+    """
+    閉じられていない（書き込み中に落ちた）ファイルから読み出せるフレーム数。
+    ヘッダの長さは当てにならない（FLAC では SF_COUNT_MAX になる）ので、終わりかエラーまで少しずつデコードして数える
+    """
+    frames = 0
+    try:
+        with sf.SoundFile(path) as file:
+            while True:
+                data = file.read(block, dtype="int16", always_2d=True)
+                if not len(data):
+                    break
+                frames += len(data)
+    except Exception:
+        pass  # 最後まで書かれていない部分
+    return frames
+
+
+def open_archive(path):
+    """録音を開く（索引なら ArchiveReader、それ以外は soundfile で開く）"""
+    if path.endswith(INDEX_SUFFIX):
+        return ArchiveReader(path)
+    return sf.SoundFile(path)
+
+
+def archive_stem(path):
+    """録音のパスから拡張子（索引の .index.json を含む）を除いたもの"""
+    if path.endswith(INDEX_SUFFIX):
+        return path[:-len(INDEX_SUFFIX)]
+    return os.path.splitext(path)[0]
@@ -0,0 +1,166 @@
+"""
+文字起こしエンジンの切り替え。
+
+どのエンジンも transcribe(audio, language, initial_prompt=None, condition_on_previous_text=True)
+で 16kHz モノラルの float32 配列を受け取り、
+{'text': 全文, 'segments': [{'start': 秒, 'end': 秒, 'text': テキスト}, ...]} を返す。
+"""
+
+
+class WhisperBackend:
+    """openai-whisper (PyTorch) によるエンジン"""
+
+    name = "whisper"
+
+    def __init__(self, model_size, device=None):
+        import whisper
+        self.model_size = model_size
+        self.model = whisper.load_model(model_size, device=device)
+
+    def transcribe(self, audio, language, initial_prompt=None, condition_on_previous_text=True):
+        result = self.model.transcribe(
+            audio,
+            language=language,
+            initial_prompt=initial_prompt,
+            condition_on_previous_text=condition_on_previous_text,
+        )
+        segments = [
+            {'start': segment['start'], 'end': segment['end'], 'text': segment['text']}
+            for segment in result.get('segments', [])
+        ]
+        return {'text': result['text'], 'segments': segments}
+
+    def transcribe_batch(self, audios, language, initial_prompt=None, condition_on_previous_text=True):
+        """
+        複数の音声をまとめて文字起こしする。
+        各音声を30秒以内の窓に分け、全窓の log-mel をまとめてエンコーダ/デコーダに通す。
+        タイムスタンプ付きでデコードし、transcribe() と同じくタイムスタンプのトークンでセグメントに分ける
+        （重なりの結合や低遅延モードの確定位置にセグメントの時刻を使うため）。
+        繰り返しなどで品質の悪い窓だけは transcribe() でやり直す。
+        """
+        import numpy as np
+        import torch
+        import whisper
+
+        windows = []  # (音声の番号, 窓の開始秒, 窓の音声)
+        for index, audio in enumerate(audios):
+            count = max(1, -(-len(audio) // whisper.audio.N_SAMPLES))
+            size = max(1, -(-len(audio) // count))
+            for start in range(0, max(len(audio), 1), size):
+                windows.append((index, start / whisper.audio.SAMPLE_RATE, audio[start:start + size]))
+
+        device = self.model.device
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(np.ascontiguousarray(window, dtype=np.float32))), self.model.dims.n_mels)
+            for _, _, window in windows
+        ]).to(device)
+        options = whisper.DecodingOptions(
+            language=language,
+            prompt=initial_prompt,
+            without_timestamps=False,
+            fp16=device.type != "cpu",
+        )
+        decoded = whisper.decode(self.model, mel, options)
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            self.model.is_multilingual, num_languages=self.model.num_languages, language=language, task="transcribe")
+        time_precision = (whisper.audio.N_FRAMES // self.model.dims.n_audio_ctx) * whisper.audio.HOP_LENGTH / whisper.audio.SAMPLE_RATE
+
+        results = [{'text': "", 'segments': []} for _ in audios]
+        for (index, offset, window), result in zip(windows, decoded):
+            if result.no_speech_prob > 0.6 and result.avg_logprob < -1.0:
+                continue  # 無音と判断された窓
+            if result.compression_ratio > 2.4 or result.avg_logprob < -1.0:
+                # 温度を上げての再試行は通常の transcribe() に任せる
+                retried = self.transcribe(window, language, initial_prompt=initial_prompt,
+                                          condition_on_previous_text=condition_on_previous_text)
+                text = retried['text']
+                segments = [dict(segment, start=segment['start'] + offset, end=segment['end'] + offset)
+                            for segment in retried['segments']]
+            else:
+                text = result.text
+                segments = split_timestamp_tokens(result.tokens, tokenizer, offset,
+                                                  len(window) / whisper.audio.SAMPLE_RATE, time_precision)
+            results[index]['text'] += text
+            results[index]['segments'].extend(segments)
+        return results
+
+
+def split_timestamp_tokens(tokens, tokenizer, offset, duration, time_precision):
+    """
+    タイムスタンプ付きでデコードしたトークン列を <|開始|> テキスト <|終了|> ごとのセグメントに分ける。
+    時刻は窓の長さ duration（秒）までに切り詰め、offset（窓の開始秒）を足す。
+    終了のタイムスタンプがないまま終わったテキストは窓の終わりまでとする
+    """
+    segments = []
+    start = 0.0
+    text_tokens = []
+    for token in tokens:
+        if token < tokenizer.timestamp_begin:
+            text_tokens.append(token)
+            continue
+        time = min((token - tokenizer.timestamp_begin) * time_precision, duration)
+        if text_tokens:
+            segments.append({'start': offset + start, 'end': offset + max(time, start),
+                             'text': tokenizer.decode(text_tokens)})
+            text_tokens = []
+        start = time
+    if text_tokens:
+        segments.append({'start': offset + start, 'end': offset + duration, 'text': tokenizer.decode(text_tokens)})
+    return [segment for segment in segments if segment['text'].strip()]
+
+
+class FasterWhisperBackend:
+    """
+    faster-whisper (CTranslate2) によるエンジン。
+    CPU では compute_type="int8" で量子化したモデルを使う。
+    """
+
+    name = "faster-whisper"
+
+    def __init__(self, model_size, device="cpu", compute_type="int8", cpu_threads=0):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("faster-whisper が必要です (uv pip install faster-whisper)") from e
+        self.model_size = model_size
+        self.model = WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def transcribe(self, audio, language, initial_prompt=None, condition_on_previous_text=True):
+        segments, _info = self.model.transcribe(
+            audio,
+            language=language,
+            initial_prompt=initial_prompt,
+            condition_on_previous_text=condition_on_previous_text,
+        )
+        # segments はジェネレータなので、ここで最後までデコードする
+        segments = [
+            {'start': segment.start, 'end': segment.end, 'text': segment.text}
+            for segment in segments
+        ]
+        return {'text': "".join(segment['text'] for segment in segments), 'segments': segments}
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def create_backend(name, model_size, **options):
+    """名前を指定してエンジンを作成（options はエンジンごとの引数）"""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"不明な文字起こしエンジンです: {name} (選択肢: {', '.join(BACKENDS)})") from None
+    return backend_class(model_size, **options)
+
+
+def transcribe_batch(backend, audios, language, **options):
+    """
+    複数の音声をまとめて文字起こしする。
+    エンジンが transcribe_batch() を持っていれば一括で、なければ1つずつ処理する。
+    """
+    batch = getattr(backend, "transcribe_batch", None)
+    if batch is not None and len(audios) > 1:
+        return batch(audios, language, **options)
+    return [backend.transcribe(audio, language, **options) for audio in audios]
@@ -0,0 +1,293 @@
+"""
+各処理段階のマイクロベンチマーク（マイクなしで実行できる）。
+
+合成音声とスタブのモデル（音声1秒あたりの遅延を指定できる）を使い、結果を JSON で出力する。
+マシンやコミットの間で比較できるよう、実行環境の情報も一緒に記録する。
+- audio_callback: 録音ブロック1つあたりの処理時間
+- segmenter: ダウンミックス・リサンプリング・VAD・音量調整の処理速度（実時間の何倍か）
+- archive: 録音ファイルの形式ごとの書き込み速度・圧縮率・エンコード CPU
+  （途中で落ちた場合を想定し、閉じる前にコピーしたファイルを読み戻せるかも確かめる）
+- formatter: 改行整形 (formatter.py) の処理速度
+- end_to_end: 録音ファイルからの文字起こし (offline.py) 全体の実時間比
+--model を指定すると、スタブの代わりに実際のモデル（tiny など）で end_to_end を測る。
+
+使い方: uv run main.py bench [--output bench.json] [--seconds 60] [--stub-delay 0.05] [--model tiny]
+"""
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import mojiokoshi
+from archiver import AudioArchiver, ARCHIVE_FORMATS, open_archive
+from formatter import format_text
+from resampler import StreamingResampler
+from ring_buffer import AudioRingBuffer
+from segmenter import downmix
+from vad import create_vad
+
+CAPTURE_RATE = 48000  # 合成音声の録音レート
+
+
+class StubBackend:
+    """
+    文字起こしエンジンの代わり。音声の長さに比例して待ってから決まったテキストを返す。
+    delay_per_sec: 音声1秒あたりの待ち時間（秒）、fixed_delay: 呼び出しごとの待ち時間（秒）
+    """
+
+    name = "stub"
+
+    def __init__(self, delay_per_sec=0.05, fixed_delay=0.0):
+        self.delay_per_sec = delay_per_sec
+        self.fixed_delay = fixed_delay
+        self.calls = 0
+
+    def transcribe(self, audio, language, initial_prompt=None, condition_on_previous_text=True):
+        self.calls += 1
+        seconds = len(audio) / mojiokoshi.TARGET_SR
+        time.sleep(self.fixed_delay + self.delay_per_sec * seconds)
+        text = "今日はいい天気ですね。" * max(1, int(seconds / 2))
+        return {'text': text, 'segments': [{'start': 0.0, 'end': seconds, 'text': text}]}
+
+
+def synthetic_audio(seconds, samplerate=CAPTURE_RATE, channels=3, seed=0):
+    """発話のような音（振幅変調した和音）と無音が交互に続く多チャンネルの合成音声"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    voice = sum(np.sin(2 * np.pi * f * t) for f in (180, 360, 720)) / 3
+    envelope = np.clip(np.sin(2 * np.pi * 0.15 * t) * 3, 0, 1) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+    audio = np.empty((len(t), channels), dtype=np.float32)
+    for channel in range(channels):
+        shift = channel * samplerate // 3
+        audio[:, channel] = 0.3 * np.roll(voice * envelope, shift) + 0.002 * rng.standard_normal(len(t))
+    return audio
+
+
+def timings(fn, repeat):
+    """fn を repeat 回呼んだ所要時間の統計（秒）"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        'repeat': repeat,
+        'mean_sec': statistics.fmean(samples),
+        'median_sec': statistics.median(samples),
+        'p95_sec': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'min_sec': samples[0],
+    }
+
+
+def bench_audio_callback(audio, workdir, block_sec=0.5):
+    """audio_callback 1回（保存スレッドへの受け渡しとリングバッファへの書き込み）の処理時間"""
+    block = int(block_sec * CAPTURE_RATE)
+    app = mojiokoshi.MojiOkoshi()
+    app.ring_buffer = AudioRingBuffer(int(mojiokoshi.RING_BUFFER_SEC * CAPTURE_RATE), audio.shape[1])
+    app.archiver = AudioArchiver(os.path.join(workdir, "callback"), CAPTURE_RATE, audio.shape[1], format="wav")
+    app.archiver.start()
+    blocks = [audio[i:i + block] for i in range(0, len(audio) - block + 1, block)]
+    samples = []
+    try:
+        for data in blocks:
+            started = time.perf_counter()
+            app.audio_callback(data, len(data), None, None)
+            samples.append(time.perf_counter() - started)
+            # 読み出し側の代わりにすぐ解放する（計測には含めない）
+            app.ring_buffer.release(app.ring_buffer.write_position)
+    finally:
+        app.archiver.close()
+    samples.sort()
+    return {
+        'block_sec': block_sec,
+        'blocks': len(samples),
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'p95_us': samples[int(len(samples) * 0.95)] * 1e6,
+        'max_us': samples[-1] * 1e6,
+        'budget_fraction': statistics.fmean(samples) / block_sec,
+    }
+
+
+def bench_segmenter(audio, repeat=3):
+    """区間切り出し前の変換処理の速度（x_realtime は実時間の何倍で処理できるか）"""
+    seconds = len(audio) / CAPTURE_RATE
+    ring = AudioRingBuffer(len(audio), audio.shape[1])
+    ring.write(audio)
+    views = ring.views(ring.read_position, ring.write_position)
+    mono = downmix(views)
+    resampled = StreamingResampler(CAPTURE_RATE, mojiokoshi.TARGET_SR).process(mono, final=True)
+    app = mojiokoshi.MojiOkoshi()
+
+    def resample():
+        resampler = StreamingResampler(CAPTURE_RATE, mojiokoshi.TARGET_SR)
+        for i in range(0, len(mono), CAPTURE_RATE // 2):
+            resampler.process(mono[i:i + CAPTURE_RATE // 2])
+        resampler.process(mono[:0], final=True)
+
+    def vad():
+        detector = create_vad("energy", mojiokoshi.TARGET_SR)
+        detector.speech_mask(resampled)
+
+    results = {}
+    for name, fn in (("downmix", lambda: downmix(views)),
+                     ("resample", resample),
+                     ("vad_energy", vad),
+                     ("gain", lambda: app.preprocess(resampled))):
+        result = timings(fn, repeat)
+        result['x_realtime'] = seconds / result['median_sec']
+        results[name] = result
+    return results
+
+
+def bench_archive(audio, workdir):
+    """
+    録音ファイルの形式ごとの書き込み速度・圧縮率・エンコード CPU。
+    半分まで書いたところで閉じる前のファイルをコピーし、落ちたセッションと同じように読み戻せるか確かめる
+    （recovered_sec。読み戻せなければ例外）
+    """
+    seconds = len(audio) / CAPTURE_RATE
+    block = CAPTURE_RATE // 2
+    half = len(audio) // 2 // block * block
+    results = {}
+    for name in ARCHIVE_FORMATS:
+        archiver = AudioArchiver(os.path.join(workdir, f"archive_{name}"), CAPTURE_RATE, audio.shape[1],
+                                 buffer_sec=seconds + 1, format=name)
+        crashed_dir = os.path.join(workdir, f"crashed_{name}")
+        os.makedirs(crashed_dir)
+        started = time.perf_counter()
+        archiver.start()
+        for i in range(0, len(audio), block):
+            if i == half:
+                # 書き込みスレッドが追いついたところで、閉じる前のファイル（と索引）をコピーする
+                while archiver.backlog_frames():
+                    time.sleep(0.01)
+                for file in os.listdir(workdir):
+                    if file.startswith(f"archive_{name}."):
+                        shutil.copy(os.path.join(workdir, file), crashed_dir)
+            archiver.submit(audio[i:i + block])
+        archiver.close()
+        elapsed = time.perf_counter() - started
+        with open_archive(os.path.join(crashed_dir, os.path.basename(archiver.path))) as crashed:
+            recovered = len(crashed.read(dtype="float32", always_2d=True))
+        if recovered == 0:
+            raise RuntimeError(f"{name}: 閉じる前にコピーした録音ファイルを読み戻せませんでした")
+        stats = archiver.stats()
+        results[name] = {
+            'x_realtime': seconds / elapsed,
+            'mb_per_sec': stats['pcm_bytes'] / elapsed / 1e6,
+            'compression_ratio': stats['compression_ratio'],
+            'cpu_per_audio_sec': stats['cpu_per_audio_sec'],
+            'bytes_written': stats['bytes_written'],
+            'recovered_sec': recovered / CAPTURE_RATE,
+        }
+    return results
+
+
+def bench_formatter(megabytes=2.0, repeat=3):
+    """改行整形の速度（日本語・英語）"""
+    results = {}
+    samples = {
+        "ja": "[マイク] 今日はいい天気ですね。明日は,3.5度まで下がるそうです.本当？",
+        "en": "[Mic] It is a fine day. Tomorrow it drops to 3.5 degrees! Really?",
+    }
+    for language, sentence in samples.items():
+        text = sentence * int(megabytes * 1e6 / len(sentence.encode("utf-8")))
+        size = len(text.encode("utf-8")) / 1e6
+        result = timings(lambda: format_text(text, language), repeat)
+        result['mb_per_sec'] = size / result['median_sec']
+        results[language] = result
+    return results
+
+
+def bench_end_to_end(audio, workdir, backend):
+    """録音ファイルから区間切り出し・前処理・文字起こし・保存までの実時間比"""
+    import soundfile as sf
+    from offline import transcribe_file
+
+    path = os.path.join(workdir, "end_to_end.wav")
+    sf.write(path, np.stack([audio[:, 0], audio[:, 1:].mean(axis=1)], axis=1), CAPTURE_RATE, subtype="PCM_16")
+    app = mojiokoshi.MojiOkoshi()
+    app.backend = backend
+    app.model_ready.set()
+    report = transcribe_file(app, path, os.path.join(workdir, "output"), os.path.join(workdir, "scenario"))
+    return {
+        'backend': getattr(backend, "name", type(backend).__name__),
+        'model_size': getattr(backend, "model_size", None),
+        'audio_sec': report['audio_sec'],
+        'elapsed_sec': report['elapsed_sec'],
+        'rtf': report['rtf'],
+        'chunks': report['chunks'],
+    }
+
+
+def environment():
+    """比較用の実行環境の情報"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'time': datetime.datetime.now().isoformat(timespec="seconds"),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(seconds=60.0, stub_delay=0.05, model=None):
+    """すべてのベンチマークを実行して結果の辞書を返す"""
+    audio = synthetic_audio(seconds)
+    workdir = tempfile.mkdtemp(prefix="mojiokoshi-bench-")
+    try:
+        if model:
+            from backends import create_backend
+            backend = create_backend(mojiokoshi.BACKEND, model, **mojiokoshi.BACKEND_OPTIONS.get(mojiokoshi.BACKEND, {}))
+        else:
+            backend = StubBackend(delay_per_sec=stub_delay)
+        results = {}
+        for name, fn in (("audio_callback", lambda: bench_audio_callback(audio, workdir)),
+                         ("segmenter", lambda: bench_segmenter(audio)),
+                         ("archive", lambda: bench_archive(audio, workdir)),
+                         ("formatter", bench_formatter),
+                         ("end_to_end", lambda: bench_end_to_end(audio, workdir, backend))):
+            print(f"計測中: {name}", file=sys.stderr)
+            results[name] = fn()
+        return {
+            'environment': environment(),
+            'parameters': {'seconds': seconds, 'capture_rate': CAPTURE_RATE, 'stub_delay_per_sec': stub_delay,
+                           'model': model, 'backend': mojiokoshi.BACKEND if model else "stub"},
+            'results': results,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(output=None, seconds=60.0, stub_delay=0.05, model=None):
+    # 各処理のメッセージは標準エラーに出し、標準出力は JSON だけにする
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmarks(seconds, stub_delay, model)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"ベンチマーク結果を {output} に保存しました。", file=sys.stderr)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+設定ファイルの読み込み。
+
+src/mojiokoshi.py の設定項目（MODEL_SIZE など）を TOML ファイルで上書きする。
+キーは設定項目の名前（大文字・小文字は区別しない）。例:
+
+    model_size = "small"
+    language = "en"
+    sd_device = "BlackHole 16ch"
+    metrics_port = 9464
+
+    [backend_options.faster-whisper]
+    compute_type = "int8"
+"""
+import tomllib
+import mojiokoshi
+
+
+def load_config(path):
+    """設定ファイルを読み込み、mojiokoshi の設定項目に反映する。反映した {名前: 値} を返す"""
+    with open(path, "rb") as f:
+        values = tomllib.load(f)
+    return apply_config(values)
+
+
+def apply_config(values):
+    """{設定項目の名前: 値} を mojiokoshi に反映する（存在しない項目や型の違う値は ValueError）"""
+    applied = {}
+    for key, value in values.items():
+        name = key.upper()
+        if not name.isupper() or not hasattr(mojiokoshi, name):
+            raise ValueError(f"不明な設定項目です: {key}")
+        current = getattr(mojiokoshi, name)
+        if current is not None and not _compatible(current, value):
+            raise ValueError(f"設定項目 {key} の値の型が違います: {value!r} ({type(current).__name__} が必要)")
+        if isinstance(current, dict):
+            value = dict(current, **value)  # 書いたキーだけ上書きする（BACKEND_OPTIONS など）
+        setattr(mojiokoshi, name, value)
+        applied[name] = value
+    return applied
+
+
+def _compatible(current, value):
+    if isinstance(current, bool) or isinstance(value, bool):
+        return isinstance(current, bool) and isinstance(value, bool)
+    if isinstance(current, (int, float)):
+        return isinstance(value, (int, float))
+    if isinstance(current, (list, tuple)):
+        return isinstance(value, (list, tuple))
+    return isinstance(value, type(current))
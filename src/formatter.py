@@ -0,0 +1,168 @@
+"""
+文字起こしテキストの改行整形（GUI のシナリオ保存と kaigyou.py / kaigyou_en.py で共通）。
+
+- 文末記号 (。！？.!?) の後に改行を入れ、[ ] などの不要な記号を取り除く（空白は元のまま残す）
+  日本語では半角の . は改行に置き換え、, と ' は取り除く（数字の間の 3.5 や 1,000 は残す）。
+  英語などはスペースも含めて元の kaigyou_en.py と同じ出力になる
+- 入力を少しずつ受け取って処理できる（format_stream）ので、大きなファイルも全体を読み込まずに整形できる
+- 全体で入力の長さに比例する時間で動く
+- morphology=True の場合は fugashi (MeCab + ipadic) で形態素解析し、句読点のない文の切れ目（「です」「ます」や
+  終助詞の後など）でも改行する。Tagger は一度だけ作って使い回す
+"""
+import functools
+import re
+
+SENTENCE_TERMINATORS = "。！？.!?"
+BLOCK_SIZE = 1 << 16         # format_file で一度に読み込む文字数
+MAX_PENDING_CHARS = 4000     # 形態素解析で改行の来ない行をこれ以上溜めない
+
+# 文の終わりになる助動詞（原形）。た/だ は後ろに名詞が続く場合（連体修飾）を除く
+_FINAL_AUXILIARIES = ("です", "ます", "た", "だ")
+
+
+@functools.lru_cache(maxsize=1)
+def get_tagger():
+    """fugashi の Tagger（ipadic 辞書）。作成に時間がかかるので使い回す"""
+    try:
+        import fugashi
+        import ipadic
+    except ImportError as e:
+        raise ImportError("形態素解析には fugashi と ipadic が必要です (uv pip install fugashi ipadic)") from e
+    return fugashi.GenericTagger(ipadic.MECAB_ARGS)
+
+
+def is_spaced(language):
+    return language not in ("ja", "zh")
+
+
+class SentenceFormatter:
+    """
+    テキストを少しずつ受け取って整形する。feed() で渡した分のうち確定した部分を返し、
+    最後に flush() で残りを返す（記号の前後を見て判断するため、末尾の数文字は次の入力まで保留する）
+    """
+
+    def __init__(self, language="ja", morphology=False, sentence_terminators=SENTENCE_TERMINATORS):
+        self.spaced = is_spaced(language)
+        self.morphology = morphology and not self.spaced
+        terminators = re.escape("".join(sentence_terminators))
+        # 文末記号の後に改行を付け、不要な記号を取り除く（空白はそのまま残す）。
+        # 日本語では数字の間の . , は残す（英語などは元の kaigyou_en.py と同じく 3.5 も文末として扱う）
+        if self.spaced:
+            self.pattern = re.compile(rf"(?P<end>[{terminators}])|(?P<removed>[\[\]])")
+        else:
+            self.pattern = re.compile(
+                rf"(?P<number>(?<=\d)[.,](?=\d))|(?P<end>[{terminators}])|(?P<removed>[\[\]',])"
+            )
+        self.previous = ""   # 直前に出力した文字（数字の判定に使う）
+        self.pending = ""    # 次の入力まで保留している末尾
+        self.line = []       # 形態素解析用: まだ改行の来ていない行
+
+    def feed(self, text):
+        text = self.pending + text
+        # 最後の1文字と、その前に続く記号・空白は、次の文字を見るまで確定できない
+        cut = max(len(text) - 1, 0)
+        while cut > 0 and not text[cut - 1].isalnum():
+            cut -= 1
+        self.pending = text[cut:]
+        return self._morph(self._punctuate(text[:cut]))
+
+    def flush(self):
+        text, self.pending = self.pending, ""
+        output = self._punctuate(text, final=True)
+        return self._morph(output, final=True)
+
+    def _punctuate(self, text, final=False):
+        if not text:
+            return ""
+        source = self.previous + text
+        parts = []
+        position = len(self.previous)
+        for match in self.pattern.finditer(source, position):
+            parts.append(source[position:match.start()])
+            if match.group("end"):
+                char = match.group("end")
+                # 日本語の半角ピリオドは改行に置き換える
+                parts.append("\n" if char == "." and not self.spaced else char + "\n")
+            elif match.lastgroup == "number":
+                parts.append(match.group("number"))
+            position = match.end()
+        parts.append(source[position:])
+        self.previous = text[-1]
+        return "".join(parts)
+
+    def _morph(self, text, final=False):
+        """形態素解析で文の切れ目に改行を入れる（改行が来た行から順に処理する）"""
+        if not self.morphology:
+            return text
+        parts = []
+        lines = text.split("\n")
+        for i, piece in enumerate(lines):
+            self.line.append(piece)
+            if i < len(lines) - 1:
+                parts.append(split_sentences("".join(self.line)) + "\n")
+                self.line = []
+        pending = "".join(self.line)
+        if final or len(pending) > MAX_PENDING_CHARS:
+            # 長すぎる行は、最後の切れ目までを確定して残りを保留する
+            split = split_sentences(pending)
+            keep = "" if final else split.rsplit("\n", 1)[-1]
+            if not final and keep == split:
+                keep = ""
+            parts.append(split[:len(split) - len(keep)])
+            self.line = [keep] if keep else []
+        else:
+            self.line = [pending] if pending else []
+        return "".join(parts)
+
+
+def split_sentences(line):
+    """句読点のない日本語の行を、形態素解析で推定した文の切れ目で改行する"""
+    if not line.strip():
+        return line
+    words = list(get_tagger()(line))
+    parts = [words[0].white_space] if words else [line]
+    for i, word in enumerate(words):
+        parts.append(word.surface)
+        if i + 1 < len(words) and _is_sentence_end(word, words[i + 1]):
+            parts.append("\n")
+        elif i + 1 < len(words) and words[i + 1].white_space:
+            parts.append(words[i + 1].white_space)
+    return "".join(parts)
+
+
+def _is_sentence_end(word, following):
+    feature = word.feature
+    next_feature = following.feature
+    if len(feature) < 7 or len(next_feature) < 2:
+        return False  # 辞書にない語
+    if next_feature[0] in ("助詞", "助動詞", "記号") or next_feature[1] in ("接尾", "非自立"):
+        return False
+    if feature[0] == "助詞" and feature[1] == "終助詞":
+        return True
+    if feature[0] == "助動詞" and feature[5] == "基本形" and feature[6] in _FINAL_AUXILIARIES:
+        return feature[6] in ("です", "ます") or next_feature[0] != "名詞"
+    return False
+
+
+def format_stream(pieces, language="ja", morphology=False, sentence_terminators=SENTENCE_TERMINATORS):
+    """テキストの断片の列（ファイルのブロックなど）を整形しながら順に返す"""
+    formatter = SentenceFormatter(language, morphology, sentence_terminators)
+    for piece in pieces:
+        output = formatter.feed(piece)
+        if output:
+            yield output
+    output = formatter.flush()
+    if output:
+        yield output
+
+
+def format_text(text, language="ja", morphology=False, sentence_terminators=SENTENCE_TERMINATORS):
+    """文字列全体を整形する"""
+    return "".join(format_stream([text], language, morphology, sentence_terminators))
+
+
+def format_file(source_path, output_path, language="ja", morphology=False):
+    """ファイルを BLOCK_SIZE ずつ読み込みながら整形して書き出す"""
+    with open(source_path, "r", encoding="utf-8") as source, open(output_path, "w", encoding="utf-8") as output:
+        for piece in format_stream(iter(lambda: source.read(BLOCK_SIZE), ""), language, morphology):
+            output.write(piece)
@@ -1,41 +1,92 @@
+import collections
 import threading
-import time
 import tkinter as tk
 from tkinter import ttk
 # --- vvv 変更点 vvv ---
 # MojiOkoshi クラスに加えて、LANGUAGE 定数をインポートします
-from mojiokoshi import MojiOkoshi, LANGUAGE
+from mojiokoshi import MojiOkoshi, LANGUAGE, SENTENCE_MORPHOLOGY, LANE_LABELS
+from formatter import format_stream
 # --- ^^^ 変更点 ^^^ ---
 from tkinter import messagebox
 from tkinter import simpledialog
 
-# --- vvv 変更点 vvv ---
-# kaigyou.py と kaigyou_en.py のロジックをここにヘルパー関数として定義します
-
-def _insert_newlines_ja(text):
-    """(from kaigyou.py) 文末記号の後に改行を入れる"""
-    sentence_terminators = ("。", "！", "？", ".", "!", "?")
-    new_text = ""
-    for char in text:
-        new_text += char
-        if char in sentence_terminators:
-            new_text += "\n"
-    # 特定の記号を削除
-    new_text = new_text.replace("[", "").replace("]", "").replace(",", "").replace(".", "").replace("'", "")
-    return new_text
-
-def _insert_newlines_en(text):
-    """(from kaigyou_en.py) 文末記号の後に改行を入れる"""
-    sentence_terminators = ("。", "！", "？", ".", "!", "?")
-    new_text = ""
-    for char in text:
-        new_text += char
-        if char in sentence_terminators:
-            new_text += "\n"
-    # 特定の記号を削除
-    new_text = new_text.replace("[", "").replace("]", "")
-    return new_text
-# --- ^^^ 変更点 ^^^ ---
+UI_FLUSH_MS = 100             # 文字起こしスレッドなどからの通知をまとめて画面に反映する間隔
+MAX_TRANSCRIPT_LINES = 2000   # 文字起こし欄に残す行数（古い行から消す。全文はファイルに保存される）
+
+
+def format_eta(seconds):
+    """残り時間の見込みの表示（計測前は空）"""
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    return f"、あと約{minutes}分{seconds:02d}秒" if minutes else f"、あと約{seconds}秒"
+
+
+class TranscriptPane:
+    """
+    文字起こし結果をシーンごとに表示する欄。
+    add() はどのスレッドからでも呼べる（通知を溜めるだけ）。Tk への反映は flush() で Tk のスレッドからまとめて行い、
+    max_lines を超えた古い行は消す。一番下を表示しているときだけ自動でスクロールする
+    """
+
+    def __init__(self, parent, max_lines=MAX_TRANSCRIPT_LINES):
+        self.frame = tk.Frame(parent)
+        self.text = tk.Text(self.frame, height=15, width=70, wrap="char", state="disabled", font=("Arial", 12))
+        self.scrollbar = tk.Scrollbar(self.frame, orient="vertical", command=self.text.yview)
+        self.text.config(yscrollcommand=self.scrollbar.set)
+        self.text.tag_config("scene", foreground="blue", font=("Arial", 12, "bold"))
+        self.text.tag_config("tentative", foreground="gray")
+        self.text.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.max_lines = max_lines
+        self.pending = collections.deque()  # 反映待ちの通知（append/popleft はスレッドセーフ）
+        self.last_scene = None
+        self.tentative = {}                 # レーン -> streaming モードの未確定テキスト
+
+    def add(self, event):
+        """MojiOkoshi の文字起こし結果の通知を溜める"""
+        self.pending.append(event)
+
+    def flush(self):
+        """溜まった通知を1回の挿入で反映する（Tk のスレッドから呼ぶ）"""
+        if not self.pending:
+            return
+        pieces = []  # Text.insert に渡す (テキスト, タグ) の並び
+        tentative_changed = False
+        while self.pending:
+            event = self.pending.popleft()
+            if event['type'] == 'tentative':
+                self.tentative[event['lane']] = event['text']
+                tentative_changed = True
+                continue
+            if event['scene'] != self.last_scene:
+                self.last_scene = event['scene']
+                pieces += [f"\n【{event['scene']}】\n", "scene"]
+            pieces += [event['text'] + "\n", ()]
+        if not pieces and not tentative_changed:
+            return
+
+        at_bottom = self.text.yview()[1] >= 1.0
+        self.text.config(state="normal")
+        # 未確定テキストは常に末尾に置き、毎回書き直す
+        if "tentative" in self.text.mark_names():
+            self.text.delete("tentative", "end-1c")
+        if pieces:
+            self.text.insert("end-1c", *pieces)
+        self.text.mark_set("tentative", "end-1c")
+        self.text.mark_gravity("tentative", "left")
+        tentative = [f"[{LANE_LABELS.get(lane, lane)}] {text}" if lane is not None else text
+                     for lane, text in self.tentative.items() if text]
+        if tentative:
+            self.text.insert("end-1c", "\n".join(tentative), "tentative")
+        # 古い行を消して行数を抑える
+        lines = int(self.text.index("end-1c").split(".")[0])
+        if lines > self.max_lines:
+            self.text.delete("1.0", f"{lines - self.max_lines + 1}.0")
+        self.text.config(state="disabled")
+        if at_bottom:
+            self.text.see("end")
 
 
 class MojiOkoshiGUI:
@@ -43,7 +94,13 @@ class MojiOkoshiGUI:
         self.root = tk.Tk()
         self.root.title("MojiOkoshi")
 
+        # モデルの読み込みはバックグラウンドで行い、ウィンドウはすぐに表示する
         self.mojiokoshi = MojiOkoshi()
+        # 進行状況と文字起こし結果は文字起こしスレッドなどから通知されるので、ここでは溜めるだけにして
+        # Tk のスレッドで UI_FLUSH_MS ごとにまとめて反映する（他のスレッドからは Tk に触れない。Tk の操作も post_ui_call でここに溜める）
+        self.progress_events = collections.deque()
+        self.mojiokoshi.add_progress_listener(self.progress_events.append)
+        self.mojiokoshi.load_model_async()
         self.recording_thread = None
         self.is_recording = False
         self.root.attributes("-topmost", True) 
@@ -77,7 +134,7 @@ class MojiOkoshiGUI:
         self.progress_label.grid(row=2, column=0, columnspan=3, padx=5, pady=10)
 
         # Transcription status display
-        self.transcription_status_label = tk.Label(self.root, text="", fg="blue")
+        self.transcription_status_label = tk.Label(self.root, text="モデル読み込み中...（録音は開始できます）", fg="orange")
         self.transcription_status_label.grid(row=3, column=0, columnspan=3, padx=5, pady=5)
 
         # Current scene display
@@ -106,13 +163,18 @@ class MojiOkoshiGUI:
         # Initialize scene history
         self.scene_history = []
 
-        # Polling for progress updates
-        self.update_progress()
-        
+        # 文字起こし結果（シーンごと）
+        self.transcript_pane = TranscriptPane(self.root)
+        self.transcript_pane.frame.grid(row=7, column=0, columnspan=3, padx=5, pady=5, sticky="nsew")
+        self.root.grid_rowconfigure(7, weight=1)
+        self.root.grid_columnconfigure(1, weight=1)
+        self.mojiokoshi.add_transcription_listener(self.transcript_pane.add)
+        self.root.after(UI_FLUSH_MS, self.flush_ui_events)
+
         # 最初のシーン名を入力
         # 最初のシーン名を入力（最前面に固定）
         self.root.attributes("-topmost", True)  # 一時的に最前面に
-        initial_scene = self.mojiokoshi.get_initial_scene_name(self.root)
+        initial_scene = self.get_initial_scene_name(self.root)
         if initial_scene:
             self.scene_title_entry.delete(0, tk.END)
             self.scene_title_entry.insert(0, initial_scene)
@@ -121,6 +183,73 @@ class MojiOkoshiGUI:
             # Update switch scene button state initially
             self.update_switch_scene_button_state()
 
+    def get_initial_scene_name(self, parent_window=None):
+        """最初のシーン名を入力するダイアログを表示"""
+        # ダイアログウィンドウを作成
+        dialog = tk.Toplevel(parent_window) if parent_window else tk.Tk()
+        dialog.title("シーン名を入力")
+        dialog.geometry("400x150")
+        dialog.resizable(False, False)
+        
+        # メインウィンドウを一時的に無効化
+        if parent_window:
+            dialog.transient(parent_window)
+            dialog.grab_set()
+            # ダイアログを中央に配置
+            dialog.geometry("+%d+%d" % (parent_window.winfo_rootx() + 50, parent_window.winfo_rooty() + 50))
+        
+        # ラベル
+        label = tk.Label(dialog, text="最初のシーン名を入力してください:", font=("Arial", 12))
+        label.pack(pady=20)
+        
+        # 入力フィールド
+        entry = tk.Entry(dialog, width=30, font=("Arial", 11))
+        entry.pack(pady=10)
+        entry.focus()  # フォーカスを設定
+        
+        # ボタンフレーム
+        button_frame = tk.Frame(dialog)
+        button_frame.pack(pady=10)
+        
+        result = {"scene_name": None}
+        
+        def on_ok():
+            scene_name = entry.get().strip()
+            if scene_name:
+                result["scene_name"] = scene_name
+                self.mojiokoshi.switch_scene(scene_name)
+                dialog.destroy()
+            else:
+                messagebox.showwarning("警告", "シーン名を入力してください。")
+        
+        def on_cancel():
+            # デフォルトシーンを使用
+            result["scene_name"] = "default"
+            self.mojiokoshi.switch_scene("default")
+            dialog.destroy()
+        
+        # OKボタン
+        ok_button = tk.Button(button_frame, text="OK", command=on_ok, width=10)
+        ok_button.pack(side=tk.LEFT, padx=5)
+        
+        # キャンセルボタン
+        cancel_button = tk.Button(button_frame, text="デフォルト", command=on_cancel, width=10)
+        cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        # EnterキーでOK
+        entry.bind('<Return>', lambda e: on_ok())
+        
+        # Escapeキーでキャンセル
+        dialog.bind('<Escape>', lambda e: on_cancel())
+        
+        # ダイアログが閉じられるまで待機
+        if parent_window:
+            dialog.wait_window()
+        else:
+            dialog.mainloop()
+        
+        return result["scene_name"]
+    
     def on_scene_title_change(self, event=None):
         """シーン名入力が変更されたときの処理。ボタン状態を更新し、警告を消す。"""
         self.update_switch_scene_button_state()
@@ -238,16 +367,11 @@ class MojiOkoshiGUI:
                         self.recording_thread.join(timeout=5)
                         #print("DEBUG: recording_thread.join()完了")
                     
-                    # キューにデータが残っているかチェック
-                    queue_size = self.mojiokoshi.audio_queue.qsize()
-                    buffer_size = len(self.mojiokoshi.partial_audio_buffer)
-                    if queue_size > 0 or buffer_size > 0:
-                        # 文字起こし処理の完了を待機
-                        self.wait_for_transcription_completion()
-                    
+                    # 残りの文字起こしは stop() の中で終わっている（進み具合は on_progress で表示される）
                     # 保存処理
                     #print("DEBUG: save_all_scenes()開始")
                     self.mojiokoshi.save_all_scenes()
+                    self.mojiokoshi.update_progress('completed')
                     # After saving, ensure self.mojiokoshi.scenes is populated from scene_transcriptions
                     if hasattr(self.mojiokoshi, "scene_transcriptions"):
                         self.mojiokoshi.scenes = dict(self.mojiokoshi.scene_transcriptions)
@@ -255,48 +379,19 @@ class MojiOkoshiGUI:
                     
                     # 完了メッセージを表示
                     #print("DEBUG: 完了メッセージ表示開始")
-                    self.root.after(0, self.show_completion_message)
+                    self.post_ui_call(self.show_completion_message)
                     #print("DEBUG: 完了メッセージ表示完了")
                     
                 except Exception as e:
                     print(f"エラーが発生しました: {e}")
-                    self.root.after(0, lambda: messagebox.showerror("エラー", f"処理中にエラーが発生しました: {e}"))
-                    self.root.after(0, self.reset_ui)
+                    error_message = f"処理中にエラーが発生しました: {e}"
+                    self.post_ui_call(lambda: messagebox.showerror("エラー", error_message))
+                    self.post_ui_call(self.reset_ui)
             
             # 停止処理を別スレッドで実行
             stop_thread = threading.Thread(target=stop_and_save, daemon=True)
             stop_thread.start()
     
-    def wait_for_transcription_completion(self):
-        """文字起こし処理の完了を待機"""
-        #print("DEBUG: 文字起こし完了待機開始")
-        while (self.mojiokoshi.audio_queue.qsize() > 0 or 
-                len(self.mojiokoshi.partial_audio_buffer) > 0 or
-                self.mojiokoshi.processing_progress['current_stage'] == 'transcribing'):
-            
-            # 進行状況を取得
-            progress = self.mojiokoshi.get_progress_percentage()
-            stage = self.mojiokoshi.processing_progress['current_stage']
-            processed = self.mojiokoshi.processing_progress['processed_items']
-            total = self.mojiokoshi.processing_progress['total_items']
-            
-            print(f"DEBUG: 進行状況 - {stage}: {processed}/{total} ({progress}%)")
-            
-            # UIを更新
-            if stage == 'transcribing':
-                self.root.after(0, lambda p=progress, s=stage: self.transcription_status_label.config(
-                    text=f"文字起こし中... {p}%", fg="orange"))
-            elif stage == 'saving':
-                self.root.after(0, lambda: self.transcription_status_label.config(
-                    text="保存中...", fg="blue"))
-            
-            time.sleep(0.5)  # 0.5秒待機
-        
-        # 完了メッセージを表示
-        self.root.after(0, lambda: self.transcription_status_label.config(
-            text="文字起こし完了！", fg="green"))
-        #print("DEBUG: 文字起こし完了")
-
     def show_completion_message(self):
         """完了メッセージを表示してシナリオまとめファイル作成"""
         #print("DEBUG: show_completion_message開始")
@@ -309,37 +404,27 @@ class MojiOkoshiGUI:
             )
             if final_title:
                 # Collect all scenes and their text
-                combined_text = ""
                 scenes = getattr(self.mojiokoshi, "scenes", {})
                 if not isinstance(scenes, dict):
                     scenes = {}
-                for scene_name, text in scenes.items():
-                    combined_text += f"【{scene_name}】\n{text}\n\n"
-                
-                # --- vvv 変更点 vvv ---
-                # LANGUAGE定数に基づいて、適切な改行処理を適用します
-                formatted_text = ""
-                if LANGUAGE == "ja":
-                    print("DEBUG: 日本語の改行フォーマットを適用します。")
-                    formatted_text = _insert_newlines_ja(combined_text)
-                elif LANGUAGE == "en":
-                    print("DEBUG: 英語の改行フォーマットを適用します。")
-                    formatted_text = _insert_newlines_en(combined_text)
+                combined = (f"【{scene_name}】\n{text}\n\n" for scene_name, text in scenes.items())
+
+                # LANGUAGE定数に基づいて、適切な改行処理を適用します（formatter.py、シーンごとに順に整形）
+                if LANGUAGE in ("ja", "en"):
+                    formatted = format_stream(combined, LANGUAGE, SENTENCE_MORPHOLOGY)
                 else:
                     # 'ja' 'en' 以外の場合は、デフォルトの結合テキストを使用
                     print(f"DEBUG: '{LANGUAGE}' に対応する改行フォーマットがありません。")
-                    formatted_text = combined_text
-                # --- ^^^ 変更点 ^^^ ---
+                    formatted = combined
                 
                 # Save to file named by final scenario title
                 import os
                 os.makedirs("log/scenario_log", exist_ok=True)
                 filename = os.path.join("log", "scenario_log", f"{final_title}.txt")
                 with open(filename, "w", encoding="utf-8") as f:
-                    # --- vvv 変更点 vvv ---
-                    # 元の combined_text の代わりに、フォーマット済みのテキストを書き込みます
-                    f.write(formatted_text)
-                    # --- ^^^ 変更点 ^^^ ---
+                    # フォーマット済みのテキストを書き込みます
+                    for piece in formatted:
+                        f.write(piece)
                 #print(f"全シーン結合テキスト保存完了: {filename}")
                 
                 result = messagebox.showinfo(
@@ -374,18 +459,67 @@ class MojiOkoshiGUI:
                                 activebackground="#da190b", activeforeground="black")
         self.is_recording = False
 
-    def update_progress(self):
+    def post_ui_call(self, callback):
+        """他のスレッドから Tk の操作を頼む（flush_ui_events で Tk のスレッドから順に呼ばれる）"""
+        self.progress_events.append({'type': 'ui', 'call': callback})
+
+    def flush_ui_events(self):
         """
-        Update the Progress label to show (processed / total) items.
+        溜まった通知を反映する（進行状況はモデルの読み込み完了以外は最新のものだけ表示する）。
+        post_ui_call で頼まれた操作は、進行状況を反映した後に頼まれた順に呼ぶ
         """
+        calls = []
         try:
-            processed = getattr(self.mojiokoshi, "processing_progress", {}).get("processed_items", 0)
-            total = getattr(self.mojiokoshi, "processing_progress", {}).get("total_items", 0)
-            self.progress_label.config(text=f"Progress: {processed}/{total}")
+            latest = None
+            while self.progress_events:
+                event = self.progress_events.popleft()
+                if event['type'] == 'model':
+                    self.on_progress(event)
+                elif event['type'] == 'ui':
+                    calls.append(event['call'])
+                else:
+                    latest = event
+            if latest is not None:
+                self.on_progress(latest)
+            self.transcript_pane.flush()
         except Exception as e:
-            print(f"DEBUG: update_progressでエラー: {e}")
+            print(f"DEBUG: flush_ui_eventsでエラー: {e}")
         finally:
-            self.root.after(500, self.update_progress)
+            self.root.after(UI_FLUSH_MS, self.flush_ui_events)
+        # ダイアログを出したりウィンドウを閉じたりする操作もあるので、次の反映を予約してから呼ぶ
+        for call in calls:
+            try:
+                call()
+            except Exception as e:
+                print(f"DEBUG: flush_ui_eventsでエラー: {e}")
+
+    def on_progress(self, event):
+        """MojiOkoshi からの進行状況の通知を表示する（Tk のスレッドで呼ばれる）"""
+        try:
+            if event['type'] == 'model':
+                if event['ready']:
+                    self.transcription_status_label.config(
+                        text=f"モデル準備完了 ({event['load_sec']:.1f}秒)", fg="green")
+                else:
+                    self.transcription_status_label.config(
+                        text=f"モデルの読み込みに失敗しました: {event['error']}", fg="red")
+                return
+            eta = format_eta(event['eta_sec'])
+            self.progress_label.config(
+                text=f"Progress: {event['processed']}/{event['total']}"
+                     f" (文字起こし済み {event['done_sec']:.0f}秒 / 残り {event['remaining_sec']:.0f}秒{eta})")
+            if self.is_recording:
+                return
+            # 停止後の残りの処理と保存の状況
+            stage = event['stage']
+            if stage in ('transcribing', 'idle') and event['remaining_sec'] > 0:
+                self.transcription_status_label.config(text=f"文字起こし中... {event['percent']}%{eta}", fg="orange")
+            elif stage == 'saving':
+                self.transcription_status_label.config(text="保存中...", fg="blue")
+            elif stage == 'completed':
+                self.transcription_status_label.config(text="文字起こし完了！", fg="green")
+        except Exception as e:
+            print(f"DEBUG: on_progressでエラー: {e}")
 
     def run(self):
         self.root.mainloop()
@@ -0,0 +1,186 @@
+"""
+GUI なしで録音と文字起こしを行う（ディスプレイのないマシン向け）。
+
+1行に1つのコマンドを標準入力、またはこのマシンの TCP ポートから受け取り、結果を1行の JSON で返す。
+    start [シーン名]   録音開始（シーン名を省略すると default）
+    scene <シーン名>   シーン切り替え
+    stop               録音停止（残りを文字起こしし、シーンごとのテキストを保存。その間も status などは受け付ける）
+    save [タイトル]    結合シナリオを保存（省略時は録音開始時刻）
+    status             状態の表示
+    quit               録音中なら停止・保存してから終了
+tkinter などの GUI モジュールは読み込まない。
+"""
+import contextlib
+import datetime
+import json
+import socketserver
+import sys
+import threading
+import mojiokoshi
+
+
+class HeadlessController:
+    """
+    コマンドを MojiOkoshi の操作に変換する。複数の接続から呼ばれても1つずつ実行する。
+    ただし stop と quit の残りの文字起こしを待つ間はロックを手放し、stopping の状態で他のコマンドに答える
+    """
+
+    # ロックを持たずに呼ぶコマンド（時間のかかる部分以外は中でロックを取る）
+    UNLOCKED_COMMANDS = ("stop", "quit")
+
+    def __init__(self, app=None):
+        self.app = app or mojiokoshi.MojiOkoshi()
+        self.lock = threading.Lock()
+        self.recording = False
+        self.stopping = False
+        self.stopped = threading.Event()   # 停止処理中でない
+        self.stopped.set()
+        self.session_title = None
+        self.finished = threading.Event()  # quit を受け取った
+
+    def handle(self, line):
+        """1行のコマンドを実行し、結果の辞書を返す"""
+        command, _, argument = line.strip().partition(" ")
+        argument = argument.strip()
+        if not command:
+            return None
+        handler = getattr(self, f"cmd_{command.lower()}", None)
+        if handler is None:
+            return {'ok': False, 'error': f"不明なコマンドです: {command}"}
+        lock = contextlib.nullcontext() if command.lower() in self.UNLOCKED_COMMANDS else self.lock
+        with lock:
+            try:
+                return dict({'ok': True}, **(handler(argument) or {}))
+            except Exception as e:
+                return {'ok': False, 'error': str(e)}
+
+    def _check_not_stopping(self):
+        if self.stopping:
+            raise RuntimeError("停止処理中です")
+
+    def cmd_start(self, scene):
+        self._check_not_stopping()
+        if self.recording:
+            raise RuntimeError("すでに録音中です")
+        if self.session_title is not None:
+            self.app.reset_results()  # 前のセッションの結果は stop/save で保存済み
+        if scene and not self.app.switch_scene(scene):
+            raise ValueError(f"シーン名 '{scene}' は使えません")
+        # 最初のシーンは start() の中で録音順の先頭に登録される
+        self.app.start()
+        self.recording = True
+        self.session_title = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        return {'wav': self.app.current_wav_path, 'scene': self.app.current_scene}
+
+    def cmd_scene(self, scene):
+        self._check_not_stopping()
+        if not self.recording:
+            raise RuntimeError("録音していません")
+        if not self.app.switch_scene(scene):
+            raise ValueError(f"シーン名 '{scene}' に切り替えられません（空または使用済み）")
+        return {'scene': scene}
+
+    def cmd_stop(self, _argument):
+        with self.lock:
+            self._check_not_stopping()
+            if not self.recording:
+                raise RuntimeError("録音していません")
+            self.stopping = True
+            self.stopped.clear()
+        try:
+            # 残りの文字起こしには時間がかかるので、ロックを持たずに待つ
+            self.app.stop()
+            self.app.save_all_scenes()
+        finally:
+            with self.lock:
+                self.recording = False
+                self.stopping = False
+                self.stopped.set()
+        return {'scenes': list(self.app.scenes)}
+
+    def cmd_save(self, title):
+        if self.recording:
+            raise RuntimeError("録音停止後に保存してください")
+        if self.session_title is None:
+            raise RuntimeError("保存する録音がありません")
+        if not self.app.scenes:
+            self.app.save_all_scenes()
+        return {'scenario': self.app.save_combined_scenario(title or self.session_title)}
+
+    def cmd_status(self, _argument):
+        app = self.app
+        return {
+            'recording': self.recording,
+            'stopping': self.stopping,
+            'scene': app.current_scene,
+            'model_ready': app.model_ready.is_set(),
+            'model_error': str(app.model_error) if app.model_error else None,
+            'queue': app.audio_queue.qsize(),
+            'stage': app.processing_progress['current_stage'],
+            'processed': app.processing_progress['processed_items'],
+            'total': app.processing_progress['total_items'],
+            'remaining_sec': app.remaining_audio_sec(),
+            'eta_sec': app.throughput.eta(app.remaining_audio_sec()),
+        }
+
+    def cmd_quit(self, _argument):
+        with self.lock:
+            stop = self.recording and not self.stopping
+        # 別の接続で停止処理中なら、それが終わってから終了する
+        result = self.cmd_stop(None) if stop else {}
+        self.stopped.wait()
+        self.finished.set()
+        return result
+
+
+def serve_stdin(controller, output=None):
+    """標準入力からコマンドを読む（入力が終わったら quit と同じ）。アプリのログは標準エラーに出す"""
+    output = output or sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        for line in sys.stdin:
+            response = controller.handle(line)
+            if response is not None:
+                output.write(json.dumps(response, ensure_ascii=False) + "\n")
+                output.flush()
+            if controller.finished.is_set():
+                return
+        controller.handle("quit")
+
+
+def serve_socket(controller, port, host="127.0.0.1"):
+    """TCP ポートでコマンドを受け付ける（quit を受け取るまで続ける）"""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                response = controller.handle(raw.decode("utf-8", errors="replace"))
+                if response is not None:
+                    self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+                if controller.finished.is_set():
+                    return
+
+    server = socketserver.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    with server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        print(f"{host}:{server.server_address[1]} でコマンドを待っています...")
+        try:
+            controller.finished.wait()
+        except KeyboardInterrupt:
+            controller.handle("quit")
+        server.shutdown()
+
+
+def main(config=None, port=None):
+    if config:
+        from config import load_config
+        applied = load_config(config)
+        print(f"設定ファイル {config} を読み込みました ({len(applied)}項目)", file=sys.stderr)
+    controller = HeadlessController()
+    # コマンドを待つ間にモデルを読み込んでおく
+    controller.app.load_model_async()
+    if port is None:
+        serve_stdin(controller)
+    else:
+        serve_socket(controller, port)
@@ -0,0 +1,121 @@
+"""
+録音セッションのジャーナル。
+
+録音中にプロセスが落ちても、log/voice/ の録音とこのジャーナルから文字起こしを再開できるようにする。
+ジャーナルは1行1レコードの JSON で、位置はすべて録音ファイルのフレーム位置（録音レート）。
+- {"type": "session", "wav": 録音（WAV または索引）のパス, "samplerate": ..., "lane_mode": ..., "scene": 最初のシーン}
+- {"type": "scene", "scene": シーン名, "frame": 切り替え位置}
+- {"type": "text", "scene", "lane", "text", "start", "end"}: 文字起こし結果（start/end があればその範囲は処理済み）
+- {"type": "covered", "scene", "lane", "start", "end"}: テキストを伴わない処理済みの範囲
+  （無音としてスキップした範囲、文字起こし結果が空の区間、streaming モードで確定した範囲）
+- {"type": "closed"}: 正常に停止した（または再開処理を終えた）
+"""
+import json
+from archiver import archive_stem
+from transcript_log import TranscriptLog
+
+
+def journal_path_for(archive_path):
+    """録音（WAV または索引）に対応するジャーナルのパス"""
+    return archive_stem(archive_path) + ".journal.jsonl"
+
+
+class SessionJournal:
+    """
+    ジャーナルへの書き込み。1件ごとにフラッシュと fsync を行う（書き込み自体は TranscriptLog のスレッドで行う）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.log = TranscriptLog(path, flush_every=1, fsync=True, format="jsonl")
+
+    def start(self, wav_path, samplerate, lane_mode, scene):
+        self.log.start()
+        self.log.write_record({'type': "session", 'wav': wav_path, 'samplerate': samplerate,
+                               'lane_mode': lane_mode, 'scene': scene})
+
+    def reopen(self):
+        """既存のジャーナルに追記する（再開処理用）"""
+        self.log.start(append=True)
+
+    def scene(self, scene, frame):
+        self.log.write_record({'type': "scene", 'scene': scene, 'frame': int(frame)})
+
+    def text(self, scene, lane, text, start=None, end=None, model=None):
+        self.log.write_record({'type': "text", 'scene': scene, 'lane': lane, 'text': text,
+                               'start': None if start is None else int(start),
+                               'end': None if end is None else int(end),
+                               'model': model})
+
+    def covered(self, scene, lane, start, end):
+        self.log.write_record({'type': "covered", 'scene': scene, 'lane': lane, 'start': int(start), 'end': int(end)})
+
+    def close(self):
+        self.log.write_record({'type': "closed"})
+        self.log.close()
+
+
+class JournalState:
+    """読み込んだジャーナルの内容"""
+
+    def __init__(self):
+        self.wav = None
+        self.samplerate = None
+        self.lane_mode = "mixed"
+        self.scenes = []    # [(開始フレーム, シーン名)]
+        self.texts = []     # [(シーン名, レーン, テキスト, 開始フレーム or None)]
+        self.covered = {}   # (シーン名, レーン) -> [(開始, 終了)]
+        self.closed = False
+
+    def scene_spans(self, total_frames):
+        """シーンごとの範囲 [(シーン名, 開始, 終了)]"""
+        spans = []
+        for i, (start, scene) in enumerate(self.scenes):
+            end = self.scenes[i + 1][0] if i + 1 < len(self.scenes) else total_frames
+            if end > start:
+                spans.append((scene, start, end))
+        return spans
+
+    def missing_ranges(self, scene, lane, start, end, min_frames=0):
+        """シーンの範囲 [start, end) のうち、レーン lane でまだ処理していない範囲"""
+        missing = []
+        position = start
+        for covered_start, covered_end in sorted(self.covered.get((scene, lane), [])):
+            if covered_start - position > min_frames:
+                missing.append((position, min(covered_start, end)))
+            position = max(position, covered_end)
+            if position >= end:
+                break
+        if end - position > min_frames:
+            missing.append((position, end))
+        return missing
+
+
+def load_journal(path):
+    """ジャーナルを読み込む。書きかけの最終行（クラッシュ時）は無視する"""
+    state = JournalState()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            kind = record.get('type')
+            if kind == "session":
+                state.wav = record['wav']
+                state.samplerate = record['samplerate']
+                state.lane_mode = record.get('lane_mode', "mixed")
+                state.scenes = [(0, record['scene'])]
+            elif kind == "scene":
+                state.scenes.append((record['frame'], record['scene']))
+            elif kind == "text":
+                state.texts.append((record['scene'], record['lane'], record['text'], record['start']))
+                if record['start'] is not None:
+                    state.covered.setdefault((record['scene'], record['lane']), []).append((record['start'], record['end']))
+            elif kind == "covered":
+                state.covered.setdefault((record['scene'], record['lane']), []).append((record['start'], record['end']))
+            elif kind == "closed":
+                state.closed = True
+    if state.wav is None:
+        raise ValueError(f"セッションの記録がないジャーナルです: {path}")
+    return state
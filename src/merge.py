@@ -0,0 +1,93 @@
+import re
+
+# 境界の重なりで一致したとみなす最小トークン数（これより短い一致は偶然とみなしタイムスタンプで判断する）
+MIN_MATCH_TOKENS = {True: 2, False: 3}
+
+
+def token_offsets(text, spaced):
+    """比較用トークンの開始位置（空白区切りの言語は単語、それ以外は空白以外の文字）"""
+    pattern = r"\S+" if spaced else r"\S"
+    return [(match.group(), match.start()) for match in re.finditer(pattern, text)]
+
+
+def overlap_length(tail, head):
+    """
+    tail の末尾と head の先頭が一致する最長の長さ。
+    KMP の失敗関数を head + [区切り] + tail に対して計算するので、長さに対して線形時間。
+    """
+    sentinel = object()
+    sequence = list(head) + [sentinel] + list(tail)
+    failure = [0] * len(sequence)
+    k = 0
+    for i in range(1, len(sequence)):
+        while k and sequence[i] != sequence[k]:
+            k = failure[k - 1]
+        if sequence[i] == sequence[k]:
+            k += 1
+        failure[i] = k
+    return failure[-1] if sequence else 0
+
+
+class OverlapMerger:
+    """
+    前の区間と音声が重なっている区間 (AudioChunk.overlap > 0) のテキストから、重なり部分の重複を取り除く。
+    - 重なり付近のセグメント（タイムスタンプで判断）のトークンだけを比べ、前の区間の末尾と一致する先頭部分を削る
+    - 十分な一致がなければ、重なりの中で終わるセグメントを削る
+    シーンとレーンごとに直前の区間の末尾を覚えておく。
+    """
+
+    def __init__(self, sample_rate, language, overlap_sec, slack_sec=1.0):
+        self.sample_rate = sample_rate
+        self.overlap = overlap_sec
+        self.spaced = language not in ("ja", "zh")
+        self.slack = slack_sec
+        self.previous = {}  # (scene, lane) -> (区間の終端, 末尾付近のトークン)
+
+    def merge(self, chunk, result):
+        """区間の文字起こし結果 result から、前の区間と重複する先頭部分を除いたテキストを返す"""
+        text = result.get("text", "")
+        segments = result.get("segments") or []
+        key = (chunk.scene, chunk.lane)
+        overlap = chunk.overlap / self.sample_rate
+        previous = self.previous.get(key)
+        self.previous[key] = (chunk.end, self._tail(text, segments, chunk.audio.size / self.sample_rate))
+        if not overlap or previous is None or previous[0] != chunk.start:
+            return text
+
+        tokens = token_offsets(text, self.spaced)
+        head = self._head(text, segments, overlap)
+        matched = overlap_length(previous[1], [token for token, _ in tokens[:head]])
+        if matched < MIN_MATCH_TOKENS[self.spaced]:
+            # 一致が見つからなければ、重なりの中で終わっているセグメントは前の区間で文字起こし済みとみなす
+            offset = 0
+            for segment in segments:
+                if segment["end"] > overlap:
+                    break
+                offset += len(token_offsets(segment["text"], self.spaced))
+            matched = offset
+        if matched >= len(tokens):
+            return ""
+        return text[tokens[matched][1]:].lstrip() if matched else text
+
+    def _head(self, text, segments, overlap):
+        """重なり付近から始まるセグメントに含まれる先頭のトークン数"""
+        if not segments:
+            return len(token_offsets(text, self.spaced))
+        count = 0
+        for segment in segments:
+            if segment["start"] >= overlap + self.slack:
+                break
+            count += len(token_offsets(segment["text"], self.spaced))
+        return count
+
+    def _tail(self, text, segments, duration):
+        """次の区間との重なり付近で終わるセグメントのトークン"""
+        tokens = [token for token, _ in token_offsets(text, self.spaced)]
+        if not segments:
+            return tokens
+        count = 0
+        for segment in reversed(segments):
+            if segment["end"] <= duration - self.overlap - self.slack:
+                break
+            count += len(token_offsets(segment["text"], self.spaced))
+        return tokens[len(tokens) - count:] if count else []
@@ -0,0 +1,156 @@
+"""
+録音中の状態を HTTP で公開する（Prometheus のテキスト形式、または JSON）。
+
+- GET /metrics       : Prometheus のテキスト形式
+- GET /metrics.json  : JSON（/metrics?format=json でも可）
+collect() は [(名前, 種類 "gauge"/"counter", 説明, 値)] を返す関数。
+値は数値、または [(ラベルの辞書, 数値)] のリスト。
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class LatencyStats:
+    """処理時間の統計（件数・合計・最大・直近）。どのスレッドからでも observe() できる"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.audio_sec = 0.0   # 対応する音声の長さの合計（実時間比の計算用）
+        self.last_rtf = 0.0
+
+    def observe(self, seconds, audio_sec=None):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.last = seconds
+            if audio_sec:
+                self.audio_sec += audio_sec
+                self.last_rtf = seconds / audio_sec
+
+    def rtf(self):
+        """全体の実時間比（処理時間の合計 ÷ 音声の長さの合計。1 を超えると追いつけていない）"""
+        return self.total / self.audio_sec if self.audio_sec else 0.0
+
+    def snapshot(self):
+        with self.lock:
+            return {'count': self.count, 'sum': self.total, 'max': self.max, 'last': self.last}
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(metrics):
+    lines = []
+    for name, kind, description, value in metrics:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        samples = value if isinstance(value, list) else [({}, value)]
+        for labels, number in samples:
+            lines.append(f"{name}{_label_text(labels)} {float(number or 0):g}")
+    return "\n".join(lines) + "\n"
+
+
+def render_json(metrics):
+    data = {}
+    for name, _kind, _description, value in metrics:
+        if isinstance(value, list):
+            data[name] = [dict(labels, value=number) for labels, number in value]
+        else:
+            data[name] = value
+    return json.dumps(data, ensure_ascii=False)
+
+
+class MetricsServer:
+    """collect() の結果を返す HTTP サーバーを専用スレッドで動かす（既定ではこのマシンからのみ接続できる）"""
+
+    def __init__(self, collect, host="127.0.0.1", port=9464):
+        self.collect = collect
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        collect = self.collect
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                as_json = url.path == "/metrics.json" or parse_qs(url.query).get("format") == ["json"]
+                if url.path not in ("/metrics", "/metrics.json"):
+                    self.send_error(404)
+                    return
+                try:
+                    metrics = collect()
+                    if as_json:
+                        body, content_type = render_json(metrics), "application/json; charset=utf-8"
+                    else:
+                        body, content_type = render_prometheus(metrics), "text/plain; version=0.0.4; charset=utf-8"
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                payload = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass  # アクセスごとに出力しない
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+class ThroughputEstimator:
+    """
+    文字起こしの処理速度（音声の秒数 ÷ 経過時間）の移動平均と、残りにかかる時間の見込み。
+    経過時間は前の区間の完了（処理を始めたのがそれより後なら開始）から数えるので、
+    待ち時間は含まず、並列に処理している場合は全体の速度になる
+    """
+
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.rate = None        # 1秒あたりに処理できる音声の秒数
+        self.last_done = None
+
+    def observe(self, audio_sec, started, now):
+        with self.lock:
+            begin = started if self.last_done is None else max(started, self.last_done)
+            self.last_done = now
+            elapsed = now - begin
+            if elapsed <= 0 or audio_sec <= 0:
+                return
+            rate = audio_sec / elapsed
+            self.rate = rate if self.rate is None else self.rate + self.smoothing * (rate - self.rate)
+
+    def eta(self, remaining_sec):
+        """remaining_sec 秒の音声を処理し終えるまでの見込み時間（秒）。計測前は None"""
+        with self.lock:
+            if not self.rate:
+                return None
+            return remaining_sec / self.rate
@@ -1,34 +1,94 @@
 import sounddevice as sd
 import numpy as np
-import whisper
-import librosa
 import threading
+import time
 import queue
 import os
-import tkinter as tk
-from tkinter import messagebox
 import datetime  # <-- 追加
-import soundfile as sf  # <-- 追加
+from ring_buffer import AudioRingBuffer
+from archiver import AudioArchiver
+from segmenter import VadSegmenter, LANES
+from vad import create_vad
+from streaming import StreamingTranscriber
+from backends import create_backend, transcribe_batch
+from worker_pool import TranscriptionPool, ReorderBuffer, configure_threads
+from scheduler import ChunkScheduler
+from merge import OverlapMerger
+from transcript_log import TranscriptLog
+from journal import SessionJournal, journal_path_for
+from metrics import MetricsServer, LatencyStats, ThroughputEstimator
+from adaptive import ModelController, ModelTier
 # pydubのインポートは不要
 
 # ----- 設定項目 -----
 RECORD_SEC = 5            # 5秒ごとの分割録音
-BUFFER_SEC = 60           # 60秒分貯まったらキューに送る
-SAMPLE_RATE = 16000       # 録音時サンプルレート
+BUFFER_SEC = 60           # 1区間の最大長（VADなしの場合は60秒ごとにキューに送る）
+SAMPLE_RATE = None        # 録音時サンプルレート（None: デバイスのネイティブレートで録音し、パイプライン内で変換）
 TARGET_SR = 16000         # Whisper用サンプルレート
 NUM_CHANNEL = 3
 VOLUME = 1.3
 MODEL_SIZE = "medium"     # whisperモデルサイズ
+BACKEND = "whisper"       # 文字起こしエンジン: "whisper"、"faster-whisper"（CPU向け int8）
+BACKEND_OPTIONS = {       # エンジンごとの設定
+    "faster-whisper": {"device": "cpu", "compute_type": "int8"},
+}
+MODEL_TIERS = None        # 処理速度に合わせて切り替えるモデル（小さい順、例: ["small", "medium", "large-v3"]、None: 切り替えない）
+                          # 辞書で {"backend": "faster-whisper", "model": "medium", "options": {"compute_type": "int8"}} とも書ける
+ADAPTIVE_TARGET_RTF = 0.8 # 実時間比（文字起こし時間 ÷ 音声の長さ）がこれを超えたら小さいモデルにする
+ADAPTIVE_MAX_LATENCY_SEC = 30  # 文字起こし待ちの音声がこの秒数を超えて増え続けたら小さいモデルにする
+ADAPTIVE_MEMORY_MB = 8000 # 同時に読み込んでおくモデルのメモリの上限（MB）。入らなければ切り替え時に読み込む
 SD_DEVICE = "mojiokoshi"  # spot検索、オーディオデバイスの設定から変更可能
 LANGUAGE = "ja"          # Whisperの言語設定（例: "ja"、"en"）
+SENTENCE_MORPHOLOGY = False  # シナリオ保存時に fugashi で句読点のない文の切れ目も推定して改行する（日本語のみ）
+RING_BUFFER_SEC = 30      # リングバッファの容量（秒）。区間切り出しスレッドが読み出すまでのデータが溜まる
+ARCHIVE_BUFFER_SEC = 30   # 録音ファイル保存スレッドへの受け渡しバッファ（秒）
+ARCHIVE_FORMAT = "wav"    # 録音ファイルの形式: "wav"（無圧縮、log/voice/<日時>.wav）、"flac"（可逆圧縮）、"opus"（非可逆、高圧縮）
+ARCHIVE_SEGMENT_SEC = 0   # 録音ファイルをこの秒数ごとに分けてシーク用の索引を作る（0: 分けない。wav 以外は分けなくても索引を作る）
+VAD_MODE = "energy"       # 音声区間検出: "energy"、"silero"、None（固定長で区切る）
+MIN_SEGMENT_SEC = 5       # これより短い区間は発話の切れ目でも閉じない
+MIN_SILENCE_SEC = 0.5     # 区間を閉じる発話の切れ目（無音）の長さ
+MAX_SILENCE_SEC = 2.0     # この長さの無音が続いたら区間長に関係なく閉じる
+SPEECH_PAD_SEC = 0.2      # 発話の前後に残す余白
+CHUNK_OVERLAP_SEC = 1.5   # 発話の途中で区切った区間に重ねる前の区間の末尾（重複したテキストは取り除く）
+LANE_MODE = "mixed"       # "mixed": 全チャンネルを混ぜて文字起こし、"split": マイクとリモートを別々に文字起こし
+LANE_LABELS = {"mic": "マイク", "remote": "リモート"}  # split 時にテキストに付けるラベル
+TRANSCRIBE_MODE = "block" # "block": 区間ごとに文字起こし（スループット重視）、"streaming": 低遅延
+STREAM_BLOCK_SEC = 0.5    # streaming 時の録音ブロック長
+STREAM_STEP_SEC = 1.5     # streaming 時に文字起こしし直す間隔
+STREAM_WINDOW_SEC = 12    # streaming 時に文字起こしする窓の長さ
+WARMUP_SEC = 1            # モデル読み込み後のウォームアップに使う無音の長さ
+TRANSCRIBE_WORKERS = 1    # 文字起こしワーカープロセス数（2以上で block モード時に並列化）
+THREADS_PER_WORKER = None # ワーカーごとの推論スレッド数（None: コア数 ÷ ワーカー数）
+TEXT_LOG_FORMAT = "jsonl"  # 即時ログの形式: "jsonl"（シーン・位置・処理時間付きの JSON）、"text"
+TEXT_LOG_FLUSH_EVERY = 10 # 即時ログをこの件数ごとにフラッシュ
+TEXT_LOG_FLUSH_SEC = 5.0  # 即時ログをこの秒数ごとにフラッシュ
+TEXT_LOG_FSYNC = False    # フラッシュ時にディスクまで同期する（停電などに強いが遅い）
+MAX_BATCH_SIZE = 8        # 溜まった区間をまとめて文字起こしする最大数（キューの長さに合わせて増減）
+SCHEDULE_POLICY = "current-first"  # "current-first": 現在のシーンを優先し前のシーンの残りは後回し、"fifo": 録音順
+AUDIO_QUEUE_MEMORY_SEC = 600  # 文字起こし待ちの音声をメモリに置く上限（秒）。超えた分はディスクに退避する（0: 上限なし）
+AUDIO_QUEUE_SPILL_DIR = None  # 退避先のディレクトリ（None: OS の一時ディレクトリ）
+METRICS_PORT = None       # 動作状況を http://METRICS_HOST:METRICS_PORT/metrics で公開する（None: 公開しない、例: 9464）
+METRICS_HOST = "127.0.0.1"  # 公開するアドレス（他のマシンから見る場合は "0.0.0.0"）
+
+# 録音コールバックの status（sounddevice.CallbackFlags）のうち回数を数えるもの
+CALLBACK_STATUS_FLAGS = ("input_overflow", "input_underflow", "output_overflow", "output_underflow", "priming_output")
 
 class MojiOkoshi:
     def __init__(self):
-        print(f"Whisperモデル({MODEL_SIZE})を読み込み中...")
-        self.model = whisper.load_model(MODEL_SIZE)
-        print("モデル読み込み完了")
+        # モデルは load_model_async() でバックグラウンドで読み込む（読み込み前に録音を始めてもよい）
+        self.backend = None
+        self.pool = None  # TRANSCRIBE_WORKERS が2以上の場合の TranscriptionPool
+        self.model_ready = threading.Event()
+        self.model_error = None
+        self.model_load_sec = None
+        self.model_load_thread = None
+        self.model_controller = None  # MODEL_TIERS を設定した場合の ModelController
 
-        self.audio_queue = queue.Queue()
+        # 文字起こし待ちの区間。シーン切り替えの前後を問わず、推論は transcribe_worker がここから順に行う
+        # 推論が追いつかない間はメモリ上の音声を AUDIO_QUEUE_MEMORY_SEC までに抑え、残りはディスクに退避する
+        self.audio_queue = ChunkScheduler(lambda: self.current_scene, SCHEDULE_POLICY,
+                                          memory_frames=int(AUDIO_QUEUE_MEMORY_SEC * TARGET_SR),
+                                          spill_dir=AUDIO_QUEUE_SPILL_DIR)
         self.text_results = []
         self.stop_flag = threading.Event()
         self.thread = None
@@ -40,21 +100,51 @@ class MojiOkoshi:
         # 録音データ保存用の設定
         self.voice_log_dir = os.path.join("log", "voice")
         os.makedirs(self.voice_log_dir, exist_ok=True)
-        self.wav_writer = None
+        # 文字起こし結果の即時ログ（専用スレッドで書き込む）
+        self.other_log_dir = os.path.join("log", "other")
+        os.makedirs(self.other_log_dir, exist_ok=True)
+        self.text_log = None
+        self.current_text_log_path = None
+        # 落ちたときに WAV から再開するためのジャーナル（WAV と同じ場所に置く）
+        self.journal = None
+        self.archiver = None  # 録音ファイルの保存は専用スレッドで行う
         self.current_wav_path = None
         
         
-        # 未完成の録音ブロックを保持するバッファ
-        self.partial_audio_buffer = []
-        self.blocksize = int(RECORD_SEC * SAMPLE_RATE)  # 1秒分のフレーム数
-        self.buffer_target_size = int(BUFFER_SEC * SAMPLE_RATE)  # 60秒分のフレーム数
+        # 録音データを保持する事前確保のリングバッファ
+        # audio_callback が書き込み、音声区間の切り出し (segmenter) が読み出してキューに送る
+        # 録音レートはデバイスに合わせて start() で決まるので、リングバッファもそこで確保する
+        self.capture_rate = None
+        self.ring_buffer = None
+        self.segmenter = None
+        self.scene_lock = threading.Lock()
+        self.streaming = False
+        self.streamers = {}  # streaming モード時のレーンごとの StreamingTranscriber
+        self.merger = None   # 重なりのある区間のテキストから重複を取り除く
+        self.stream_ranges = {}  # streaming モードで窓に追加した範囲（レーン -> [シーン, 開始, 終了]、ジャーナル用）
+
+        # 文字起こし結果の通知先（GUIなど）。event は {'type': 'committed'/'tentative', 'scene', 'text', 'lane'}
+        self.transcription_listeners = []
         
+        # 動作状況の計測（METRICS_PORT を設定すると HTTP で公開する）
+        self.inference_latency = LatencyStats()  # 区間ごとの文字起こし時間と実時間比
+        self.callback_status_counts = {}          # 録音コールバックの status フラグごとの回数
+        self.metrics_server = None
+
         # 処理進行状況の追跡
         self.processing_progress = {
             'total_items': 0,
             'processed_items': 0,
             'current_stage': 'idle'  # idle, transcribing, saving, completed
         }
+        # 進行状況の通知先（GUIなど）と、残り時間の見込みに使う処理速度
+        self.progress_listeners = []
+        self.progress_lock = threading.Lock()
+        self.throughput = ThroughputEstimator()
+        self.in_flight_chunks = 0    # キューから取り出して文字起こし中の区間
+        self.in_flight_frames = 0
+        self.completed_chunks = 0
+        self.done_audio_sec = 0.0
 
 
     def audio_callback(self, indata, frames, time_info, status):
@@ -62,146 +152,512 @@ class MojiOkoshi:
             return
         if status:
             print(f"audio_callback status: {status}")
+            for flag in CALLBACK_STATUS_FLAGS:
+                if getattr(status, flag, False):
+                    self.callback_status_counts[flag] = self.callback_status_counts.get(flag, 0) + 1
             
-        # 録音データをWAVファイルに書き込む
-        try:
-            if self.wav_writer:
-                # indata は (frames, 3) の形状
-                
-                # Ch 0: マイク音声 (そのまま)
-                mic_channel = indata[:, 0]
-                
-                # Ch 1, 2: 仮想L, 仮想R を平均化してモノラルに
-                virtual_mono = np.mean(indata[:, 1:3], axis=1)
-                
-                # 2チャンネルのNumpy配列を作成
-                output_data = np.stack((mic_channel, virtual_mono), axis=1)
-                
-                # 2チャンネルのデータをWAVに書き込む
-                self.wav_writer.write(output_data)
-        except Exception as e:
-            print(f"WAVファイルへの書き込みエラー: {e}")
+        # 録音データを保存スレッドに渡す（2チャンネル化と書き込みは保存スレッド側で行う）
+        archiver = self.archiver
+        if archiver and not archiver.submit(indata):
+            print(f"⚠️ 録音ファイルの保存が追いつかないためブロックを破棄しました (累計: {archiver.dropped_blocks})")
             
         #print(f" データサイズ: {indata.shape}, フレーム数: {frames}")
         
-        # データをバッファに追加
-        self.partial_audio_buffer.append(indata.copy())
+        # データをリングバッファにコピー（確保済みの領域へ書き込むだけ）
+        if frames and self.ring_buffer.write(indata) == 0:
+            print(f"⚠️ リングバッファが満杯のため {frames} フレームを破棄しました (累計: {self.ring_buffer.overrun_frames})")
         
-        # バッファが60秒分（buffer_target_size）に達したらキューに追加
-        total_frames = sum(data.shape[0] for data in self.partial_audio_buffer)
-        if total_frames >= self.buffer_target_size:
-            # バッファのデータを結合してキューに追加
-            combined_data = np.concatenate(self.partial_audio_buffer, axis=0)
-            self.audio_queue.put(combined_data)
-            print(f"60秒分のブロックをキューに追加 - 現在のキューサイズ: {self.audio_queue.qsize()}")
-            # バッファをクリア
-            self.partial_audio_buffer = []
-        # else:
-        #     print(f"DEBUG: データをバッファに蓄積中 - 現在のフレーム数: {total_frames}/{self.buffer_target_size} ({total_frames/self.buffer_target_size*100:.1f}%)")
+        # 音声区間の切り出しスレッドに通知
+        segmenter = self.segmenter
+        if segmenter:
+            segmenter.notify()
+
+    def pending_frames(self):
+        """まだ文字起こしのキューに送っていない（スキップもしていない）フレーム数"""
+        if self.segmenter:
+            return self.segmenter.pending_frames()
+        return self.ring_buffer.available() if self.ring_buffer else 0
+
+    def enqueue_chunk(self, chunk):
+        """切り出した音声区間をキューに追加"""
+        self.audio_queue.put(chunk)
+        spilled = self.audio_queue.spill_stats()['spilled_chunks']
+        print(f"{chunk.frames / TARGET_SR:.1f}秒の音声区間をキューに追加 - 現在のキューサイズ: {self.audio_queue.qsize()}"
+              + (f" (うちディスクに退避中: {spilled})" if spilled else ""))
+
+    def load_model_async(self):
+        """モデルの読み込みとウォームアップをバックグラウンドで開始する（2回目以降は何もしない）"""
+        if self.model_load_thread is None:
+            self.model_load_thread = threading.Thread(target=self.load_model, daemon=True)
+            self.model_load_thread.start()
+        return self.model_load_thread
+
+    def load_model(self):
+        """
+        モデルを読み込み、短い無音で一度推論してから利用可能にする。
+        torch などの重いモジュールはここで初めて import される。
+        """
+        started = time.perf_counter()
+        try:
+            if TRANSCRIBE_WORKERS > 1 and TRANSCRIBE_MODE == "block":
+                # 複数プロセス: 各ワーカーが自分のモデルを読み込む
+                print(f"Whisperモデル({MODEL_SIZE}, {BACKEND})を {TRANSCRIBE_WORKERS} プロセスで読み込み中...")
+                pool = TranscriptionPool(BACKEND, MODEL_SIZE, BACKEND_OPTIONS.get(BACKEND, {}), LANGUAGE,
+                                         TRANSCRIBE_WORKERS, threads=THREADS_PER_WORKER)
+                pool.warm_up(int(WARMUP_SEC * TARGET_SR))
+                self.pool = pool
+                self.pool_slots = threading.Semaphore(TRANSCRIBE_WORKERS * 2)
+                self.backend = pool
+                return
+            configure_threads(THREADS_PER_WORKER)
+            if MODEL_TIERS and TRANSCRIBE_MODE == "block":
+                # 実時間比に合わせてモデルを切り替える（最初は MODEL_SIZE、候補になければいちばん小さいモデル）
+                tiers = [ModelTier(spec, BACKEND, BACKEND_OPTIONS.get(BACKEND, {})) for spec in MODEL_TIERS]
+                initial = next((i for i, tier in enumerate(tiers)
+                                if tier.model == MODEL_SIZE and tier.backend == BACKEND), 0)
+                controller = ModelController(
+                    tiers,
+                    lambda tier: self.create_warm_backend(tier.backend, tier.model, tier.options),
+                    lambda backend: setattr(self, 'backend', backend),
+                    initial=initial,
+                    target_rtf=ADAPTIVE_TARGET_RTF,
+                    max_latency_sec=ADAPTIVE_MAX_LATENCY_SEC,
+                    memory_mb=ADAPTIVE_MEMORY_MB,
+                )
+                controller.start()
+                self.model_controller = controller
+                return
+            self.backend = self.create_warm_backend(BACKEND, MODEL_SIZE, BACKEND_OPTIONS.get(BACKEND, {}))
+        except Exception as e:
+            self.model_error = e
+            print(f"モデルの読み込みに失敗しました: {e}")
+        finally:
+            self.model_load_sec = time.perf_counter() - started
+            self.model_ready.set()
+            if self.backend is not None:
+                print(f"モデルの準備ができました ({self.model_load_sec:.1f}秒)")
+            self._publish_progress('model', ready=self.backend is not None,
+                                   error=str(self.model_error) if self.model_error else None,
+                                   load_sec=self.model_load_sec)
+
+    def create_warm_backend(self, backend_name, model_size, options):
+        """エンジンを作成し、初回推論時の確保コストを短い無音で払っておく"""
+        print(f"Whisperモデル({model_size}, {backend_name})を読み込み中...")
+        backend = create_backend(backend_name, model_size, **options)
+        print("モデル読み込み完了。ウォームアップ中...")
+        try:
+            backend.transcribe(np.zeros(int(WARMUP_SEC * TARGET_SR), dtype=np.float32), LANGUAGE)
+        except Exception as e:
+            print(f"ウォームアップに失敗しました（処理は続行します）: {e}")
+        return backend
+
+    def model_name(self):
+        """いま文字起こしに使っているモデルの名前（即時ログに記録する）"""
+        if self.model_controller is not None:
+            return self.model_controller.tier.name
+        return MODEL_SIZE
+
+    def observe_throughput(self, processing_sec, audio_sec):
+        """処理速度を ModelController に伝え、必要ならモデルを切り替える（文字起こしスレッドから呼ぶ）"""
+        if self.model_controller is None:
+            return
+        try:
+            self.model_controller.observe(processing_sec, audio_sec, self.audio_queue.queued_frames() / TARGET_SR)
+        except Exception as e:
+            print(f"モデルの切り替えに失敗しました: {e}")
+
+    def preprocess(self, mono):
+        """音量調整（リサンプリングは区間の切り出し時に済んでいる）"""
+        return np.clip(mono * VOLUME, -1.0, 1.0)
+
+    def resolve_capture_rate(self):
+        """録音レートを決める（SAMPLE_RATE が None ならデバイスのネイティブレート）"""
+        if SAMPLE_RATE:
+            return int(SAMPLE_RATE)
+        try:
+            return int(sd.query_devices(SD_DEVICE, 'input')['default_samplerate'])
+        except Exception as e:
+            print(f"デバイスのサンプルレートを取得できないため {TARGET_SR}Hz で録音します: {e}")
+            return TARGET_SR
+
+    def transcribe_audio(self, audio, **options):
+        """前処理済みの音声を文字起こしエンジンで文字起こしする"""
+        if self.backend is None:
+            raise RuntimeError(f"モデルが読み込まれていません: {self.model_error}")
+        return self.backend.transcribe(audio, LANGUAGE, **options)
+
+    def transcribe_audio_batch(self, audios, **options):
+        """複数の前処理済み音声をまとめて文字起こしする（エンジンが対応していれば一括で）"""
+        if self.backend is None:
+            raise RuntimeError(f"モデルが読み込まれていません: {self.model_error}")
+        return transcribe_batch(self.backend, audios, LANGUAGE, **options)
+
+    def transcribe_stream_window(self, audio, prompt):
+        """streaming モードで窓を文字起こしする"""
+        started = time.perf_counter()
+        result = self.transcribe_audio(audio, initial_prompt=prompt or None, condition_on_previous_text=False)
+        self.inference_latency.observe(time.perf_counter() - started, len(audio) / TARGET_SR)
+        return result
+
+    def on_stream_commit(self, scene, text, lane=None):
+        """streaming モードで確定したテキストを反映"""
+        print(text)
+        self.text_results.append(text)
+        self.add_transcription(text, scene, lane, model=self.model_name())
+
+    def get_streamer(self, lane):
+        """レーンごとの StreamingTranscriber（なければ作成）"""
+        streamer = self.streamers.get(lane)
+        if streamer is None:
+            streamer = StreamingTranscriber(
+                self.transcribe_stream_window,
+                lambda scene, text: self.on_stream_commit(scene, text, lane),
+                lambda scene, text: self.publish_tentative(scene, text, lane),
+                TARGET_SR,
+                LANGUAGE,
+                step_sec=STREAM_STEP_SEC,
+                window_sec=STREAM_WINDOW_SEC,
+            )
+            self.streamers[lane] = streamer
+        return streamer
+
+    def stream_chunk(self, chunk):
+        """低遅延モード: 窓に追加して文字起こしし直す（遅れている間は追加のみ）"""
+        self._chunks_started([chunk])
+        started = time.perf_counter()
+        try:
+            self.get_streamer(chunk.lane).feed(chunk, self.preprocess(chunk.audio), decode=self.audio_queue.empty())
+        except Exception as e:
+            print(f"[ストリーミング文字起こしエラー: {e}]")
+        self._chunk_done(chunk, started)
+        covered = self.stream_ranges.get(chunk.lane)
+        if covered is not None and covered[0] != chunk.scene:
+            self._journal_stream_range(chunk.lane)
+            covered = None
+        if covered is None:
+            self.stream_ranges[chunk.lane] = [chunk.scene, chunk.start, chunk.end]
+        else:
+            covered[2] = chunk.end
+
+    def finalize_streams(self):
+        """低遅延モードで未確定のテキストをすべて確定する（停止時）"""
+        for lane in list(self.streamers):
+            self._finalize_stream(lane)
+        for lane in list(self.stream_ranges):
+            self._journal_stream_range(lane)
+
+    def finalize_idle_streams(self):
+        """
+        低遅延モードで、録音上で一定時間（MAX_SILENCE_SEC と streaming の区間長の2倍の長いほう）
+        新しい区間が来ていないレーンの未確定テキストを確定する。
+        文字起こしの待ち時間（実時間）ではなく音声の位置で判断するので、処理が速くても発話の途中では確定しない
+        """
+        segmenter = self.segmenter
+        if segmenter is None:
+            return
+        idle = int(max(MAX_SILENCE_SEC, 2 * STREAM_STEP_SEC) * TARGET_SR)
+        for lane, streamer in list(self.streamers.items()):
+            if streamer.scene is not None and segmenter.position - streamer.buffer_end >= idle:
+                self._finalize_stream(lane)
+                if lane in self.stream_ranges:
+                    self._journal_stream_range(lane)
+
+    def _finalize_stream(self, lane):
+        streamer = self.streamers[lane]
+        if streamer.scene is None:
+            return
+        try:
+            streamer.finalize()
+        except Exception as e:
+            print(f"[ストリーミング文字起こしエラー: {e}]")
+
+    def _journal_stream_range(self, lane):
+        """streaming モードで確定まで済んだ範囲をジャーナルに記録する"""
+        scene, start, end = self.stream_ranges.pop(lane)
+        self.journal_covered(scene, lane, start, end)
+
+    def journal_covered(self, scene, lane, start, end):
+        """
+        テキストを伴わずに処理済みになった範囲（無音としてスキップした範囲や、文字起こし結果が空の区間）を
+        ジャーナルに記録する。位置は TARGET_SR
+        """
+        journal = self.journal
+        if journal:
+            journal.covered(scene, lane, self.capture_frame(start), self.capture_frame(end))
+
+    def capture_frame(self, position):
+        """区間の位置（TARGET_SR）を録音ファイルのフレーム位置に変換"""
+        return position * self.capture_rate // TARGET_SR
+
+    def batch_limit(self):
+        """
+        一度にまとめて文字起こしする区間数。
+        追いついている間は1つずつ（遅延優先）、キューが溜まるほど大きくする（スループット優先）。
+        """
+        if self.pool is not None:
+            return 1
+        depth = self.audio_queue.qsize() + 1
+        # レーンを分けている場合は、同時に溜まった各レーンの区間は必ずまとめる
+        lanes = len(LANES.get(LANE_MODE, LANES["mixed"]))
+        return max(lanes, min(MAX_BATCH_SIZE, depth))
+
+    def take_queued_chunks(self, limit):
+        """キューにすでに溜まっている区間を待たずに最大 limit 個取り出す"""
+        chunks = []
+        while len(chunks) < limit:
+            try:
+                chunks.append(self.audio_queue.get_nowait())
+            except queue.Empty:
+                break
+        return chunks
+
+    def transcribe_chunks(self, chunks, indexes, total):
+        """区間をまとめて文字起こしし、録音順にシーンに反映する"""
+        texts = [None] * len(chunks)
+        targets = [i for i, chunk in enumerate(chunks) if chunk.audio.size > 0]
+        for i, chunk in enumerate(chunks):
+            if chunk.audio.size == 0:
+                texts[i] = "[音声なし]"
+        processing_sec = None
+        model = self.model_name()
+        started = time.perf_counter()
+        if targets:
+            try:
+                # リサンプリングしてWhisperで文字起こし
+                results = self.transcribe_audio_batch([self.preprocess(chunks[i].audio) for i in targets])
+                processing_sec = (time.perf_counter() - started) / len(targets)
+                for i in targets:
+                    self.inference_latency.observe(processing_sec, chunks[i].frames / TARGET_SR)
+                self.observe_throughput(processing_sec * len(targets), sum(chunks[i].frames for i in targets) / TARGET_SR)
+                for i, result in zip(targets, results):
+                    # 前の区間と重なっている部分の重複を取り除く
+                    texts[i] = self.merger.merge(chunks[i], result)
+                    print(texts[i])
+            except Exception as e:
+                # エラーが発生しても処理を継続
+                for i in targets:
+                    texts[i] = f"[文字起こしエラー: {str(e)[:50]}...]"
+        # まとめて処理した区間は一度に終わるので、処理速度は合計で記録する
+        self.throughput.observe(sum(chunk.frames for chunk in chunks) / TARGET_SR, started, time.perf_counter())
+        for chunk, index, text in zip(chunks, indexes, texts):
+            if text:
+                self.text_results.append(text)
+                self.add_transcription(text, chunk.scene, chunk.lane, chunk=chunk, processing_sec=processing_sec,
+                                       model=model)
+            else:
+                self.journal_covered(chunk.scene, chunk.lane, chunk.start, chunk.end)
+            self._chunk_done(chunk)
+            print(f"処理完了 ({index} / {total})")
+
+    def _submit_to_pool(self, chunk, index, total):
+        """ワーカープロセスに区間を投入する（結果は _deliver_in_order で録音順に反映）"""
+        # 投入数を制限し、それ以上はキューに残しておく
+        self.pool_slots.acquire()
+        started = time.perf_counter()
+        if chunk.audio.size == 0:
+            self._chunk_done(chunk, started)
+            self._deliver_in_order(index, chunk, "[音声なし]", total)
+            return
+        try:
+            future = self.pool.submit(self.preprocess(chunk.audio))
+        except Exception as e:
+            self._chunk_done(chunk, started)
+            self._deliver_in_order(index, chunk, f"[文字起こしエラー: {str(e)[:50]}...]", total)
+            return
+        future.add_done_callback(lambda f: self._on_pool_done(f, index, chunk, total, started))
+
+    def _on_pool_done(self, future, index, chunk, total, started):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = f"[文字起こしエラー: {str(e)[:50]}...]"
+        processing_sec = time.perf_counter() - started
+        self.inference_latency.observe(processing_sec, chunk.frames / TARGET_SR)
+        self._chunk_done(chunk, started)
+        self._deliver_in_order(index, chunk, result, total, processing_sec)
+
+    def _deliver_in_order(self, index, chunk, result, total, processing_sec=None):
+        """
+        完了順に届く結果を録音順に並べ直してからシーンに反映する。
+        result は文字起こし結果、または "[音声なし]" などのテキスト
+        """
+        with self.reorder_lock:
+            ready = self.reorder_buffer.add(index, (index, chunk, result, total, processing_sec))
+            for ready_index, ready_chunk, ready_result, ready_total, ready_sec in ready:
+                # 重なりの重複除去は録音順に並んでから行う
+                ready_text = ready_result if isinstance(ready_result, str) else self.merger.merge(ready_chunk, ready_result)
+                print(ready_text)
+                if ready_text:
+                    self.text_results.append(ready_text)
+                    self.add_transcription(ready_text, ready_chunk.scene, ready_chunk.lane,
+                                           chunk=ready_chunk, processing_sec=ready_sec, model=MODEL_SIZE)
+                else:
+                    self.journal_covered(ready_chunk.scene, ready_chunk.lane, ready_chunk.start, ready_chunk.end)
+                print(f"処理完了 ({ready_index} / {ready_total})")
+                self.audio_queue.task_done()
+        self.pool_slots.release()
 
     def transcribe_worker(self):
         processed_index = 0
         #print("DEBUG: transcribe_worker開始")
-        while not self.stop_flag.is_set() or not self.audio_queue.empty() or self.partial_audio_buffer:
-            #print(f"DEBUG: ループ開始 - stop_flag: {self.stop_flag.is_set()}, queue_empty: {self.audio_queue.empty()}, buffer_empty: {len(self.partial_audio_buffer) == 0}")
+        while not self.stop_flag.is_set() or not self.audio_queue.empty() or self.pending_frames():
+            #print(f"DEBUG: ループ開始 - stop_flag: {self.stop_flag.is_set()}, queue_empty: {self.audio_queue.empty()}, pending: {self.pending_frames()}")
             try:
                 # stop_flagが設定されている場合は短いタイムアウトで待機
                 timeout = 0.5 if self.stop_flag.is_set() else 1.0
                 #print("DEBUG: キューからデータを取得中...")
-                data = self.audio_queue.get(timeout=timeout)
-                #print("DEBUG: データ取得成功")
-                try:
-                    processed_index += 1
-                    total_queue = processed_index + self.audio_queue.qsize()
-                    print(f"処理開始 ({processed_index} / {total_queue})")
-
-                    # モノラル化
-                    if data.ndim > 1:
-                        mono = np.mean(data, axis=1)
-                    else:
-                        mono = data.flatten()
-
-                    # 空データチェック
-                    if mono.size == 0:
-                        text = "[音声なし]"
-                        #print("DEBUG: 音声データが空です。プレースホルダーを追加します。")
-                        self.text_results.append(text)
-                        self.add_transcription(text)
-                        print(f"処理完了 ({processed_index} / {total_queue})")
-                        continue
-
-                    # リサンプリング
-                    resampled = librosa.resample(mono, orig_sr=SAMPLE_RATE, target_sr=TARGET_SR)
-                    resampled = np.clip(resampled * VOLUME, -1.0, 1.0)
-
-                    # Whisperで文字起こし
-                    #print(f"Whisper処理開始 ({processed_index} / {total_queue})")
-                    try:
-                        result = self.model.transcribe(resampled, language=LANGUAGE)
-                        text = result["text"]
-                        print(text)
-                        self.text_results.append(text)
-                        self.add_transcription(text)
-                    except Exception as e:
-                        #print(f"DEBUG: Whisper処理中にエラー: {e}")
-                        # エラーが発生しても処理を継続
-                        text = f"[文字起こしエラー: {str(e)[:50]}...]"
-                        self.text_results.append(text)
-                        self.add_transcription(text)
-                    print(f"処理完了 ({processed_index} / {total_queue})")
-                finally:
-                    self.audio_queue.task_done()
+                chunk = self.audio_queue.get(timeout=timeout)
             except queue.Empty:
                 #print("DEBUG: キューが空（タイムアウト）")
-                # stop_flagが設定されていて、キューが空でバッファも空の場合は終了
-                if self.stop_flag.is_set() and self.audio_queue.empty() and len(self.partial_audio_buffer) == 0:
+                # stop_flagが設定されていて、キューが空で未送信データもない場合は終了
+                if self.stop_flag.is_set() and self.audio_queue.empty() and self.pending_frames() == 0:
                     #print("DEBUG: stop_flagが設定されていてキューとバッファが空なので終了")
                     break
+                # 発話が途切れたら低遅延モードの残りを確定
+                self.finalize_idle_streams()
                 continue
+
+            if not self.model_ready.is_set():
+                # モデルの準備ができるまで音声はキューに溜めておく
+                print("モデルの読み込み完了を待っています...")
+                self.model_ready.wait()
+
+            if self.streaming:
+                try:
+                    self.stream_chunk(chunk)
+                finally:
+                    self.audio_queue.task_done()
+                continue
+
+            # キューに溜まっている区間（別レーン、シーン切り替えや停止時の残りなど）もまとめて文字起こしする
+            chunks = [chunk] + self.take_queued_chunks(self.batch_limit() - 1)
+            indexes = list(range(processed_index + 1, processed_index + len(chunks) + 1))
+            processed_index += len(chunks)
+            total_queue = processed_index + self.audio_queue.qsize()
+            self._chunks_started(chunks)
+            for index in indexes:
+                print(f"処理開始 ({index} / {total_queue})")
+
+            if self.pool is not None:
+                # 複数プロセス: 投入だけ行い、結果は録音順に並べ直してから反映する
+                for index, pooled_chunk in zip(indexes, chunks):
+                    self._submit_to_pool(pooled_chunk, index, total_queue)
+                continue
+
+            try:
+                self.transcribe_chunks(chunks, indexes, total_queue)
+            finally:
+                for _ in chunks:
+                    self.audio_queue.task_done()
+        # 低遅延モードの残りを確定
+        self.finalize_streams()
         #print("DEBUG: transcribe_worker終了")
 
     def start(self):
         #print("DEBUG: start()メソッド開始")
         
+        # 前回の stop() で止めた文字起こしスレッドを再び動かせるようにする
+        self.stop_flag.clear()
+        self.reset_progress()
+        # 最初のシーンを登録しておく（最初のテキストより前にシーンを切り替えても、録音順に保存されるように）
+        with self.transcription_lock:
+            self.scene_transcriptions.setdefault(self.current_scene, [])
+        # モデルの読み込みがまだなら開始（完了を待たずに録音を始める）
+        self.load_model_async()
+        self.start_metrics_server()
+
         try:
+            capture_rate = self.resolve_capture_rate()
             sd.default.device = SD_DEVICE
-            sd.default.samplerate = SAMPLE_RATE
+            sd.default.samplerate = capture_rate
             sd.default.channels = NUM_CHANNEL
 
+            # 録音データのリングバッファを確保（レートが変わらなければ使い回す）
+            if self.ring_buffer is None or self.capture_rate != capture_rate:
+                self.ring_buffer = AudioRingBuffer(int(RING_BUFFER_SEC * capture_rate), NUM_CHANNEL)
+            self.capture_rate = capture_rate
+
             # 録音ファイルの設定
             try:
                 now = datetime.datetime.now()
                 timestamp_str = now.strftime("%Y-%m-%d_%H-%M-%S")
-                filename = now.strftime("%Y-%m-%d_%H-%M-%S") + ".wav"
-                self.current_wav_path = os.path.join(self.voice_log_dir, filename)
-                
-                # 保存するWAVファイルは 2 チャンネルで作成
-                self.wav_writer = sf.SoundFile(
-                    self.current_wav_path, 
-                    mode='w', 
-                    samplerate=SAMPLE_RATE, # 16000
-                    channels=2              # 2チャンネル (Mic, Virtual Mono)
-                )
-                print(f"録音データを {self.current_wav_path} に (2ch, 16kHzで) 保存開始...")
+                stem = os.path.join(self.voice_log_dir, timestamp_str)
+
+                # 保存するファイルは 2 チャンネル (Mic, Virtual Mono) で作成（エンコードは保存スレッドで行う）
+                archiver = AudioArchiver(stem, capture_rate, NUM_CHANNEL, buffer_sec=ARCHIVE_BUFFER_SEC,
+                                         format=ARCHIVE_FORMAT, segment_sec=ARCHIVE_SEGMENT_SEC)
+                archiver.start()
+                self.archiver = archiver
+                # 圧縮形式や分割保存の場合は索引ファイルのパス（resume/transcribe に渡せる）
+                self.current_wav_path = archiver.path
+                print(f"録音データを {self.current_wav_path} に (2ch, {capture_rate}Hz, {archiver.format}で) 保存開始...")
             except Exception as e:
                 print(f"録音ファイルの作成に失敗しました: {e}")
-                self.wav_writer = None
+                self.archiver = None
+
+            if self.archiver:
+                try:
+                    journal = SessionJournal(journal_path_for(self.current_wav_path))
+                    journal.start(self.current_wav_path, capture_rate, LANE_MODE, self.current_scene)
+                    self.journal = journal
+                except Exception as e:
+                    print(f"ジャーナルの作成に失敗しました（再開はできません）: {e}")
+                    self.journal = None
 
             try:
-                text_filename = timestamp_str + ".txt"
+                text_filename = timestamp_str + (".jsonl" if TEXT_LOG_FORMAT == "jsonl" else ".txt")
                 self.current_text_log_path = os.path.join(self.other_log_dir, text_filename)
-                with open(self.current_text_log_path, "w", encoding="utf-8") as f:
-                    f.write(f"--- 録音開始: {timestamp_str} ---\n")
+                text_log = TranscriptLog(self.current_text_log_path, flush_every=TEXT_LOG_FLUSH_EVERY,
+                                         flush_sec=TEXT_LOG_FLUSH_SEC, fsync=TEXT_LOG_FSYNC, format=TEXT_LOG_FORMAT)
+                text_log.start(header=f"録音開始: {timestamp_str}")
+                self.text_log = text_log
                 print(f"即時ログを {self.current_text_log_path} に保存開始...")
             except Exception as e:
                 print(f"即時ログファイルの作成に失敗しました: {e}")
+                self.text_log = None
                 self.current_text_log_path = None
 
-            blocksize = int(RECORD_SEC * SAMPLE_RATE)
+            self.merger = OverlapMerger(TARGET_SR, LANGUAGE, CHUNK_OVERLAP_SEC)
+
+            # 複数プロセス時の結果の並べ直し（processed_index は1から始まる）
+            self.reorder_buffer = ReorderBuffer(first=1)
+            self.reorder_lock = threading.Lock()
+
+            streaming = TRANSCRIBE_MODE == "streaming"
+            self.streaming = streaming
+            self.streamers = {}
+            # streaming モードは窓を録音順につなげるので、シーンをまたいで順番を入れ替えない
+            self.audio_queue.policy = "fifo" if streaming else SCHEDULE_POLICY
+
+            # 音声区間の切り出しを開始（streaming 時は短い区間を連続して送る）
+            self.segmenter = VadSegmenter(
+                self.ring_buffer,
+                self.enqueue_chunk,
+                TARGET_SR,
+                vad=create_vad(VAD_MODE, TARGET_SR),
+                lanes=LANES[LANE_MODE],
+                # レーンを分ける場合はレーンごとに VAD を持つ（固定長指定でも無音のレーンは飛ばす）
+                vad_factory=(lambda: create_vad(VAD_MODE or "energy", TARGET_SR)) if LANE_MODE == "split" else None,
+                min_segment_sec=0 if streaming else MIN_SEGMENT_SEC,
+                max_segment_sec=STREAM_STEP_SEC if streaming else BUFFER_SEC,
+                min_silence_sec=MIN_SILENCE_SEC,
+                max_silence_sec=MAX_SILENCE_SEC,
+                speech_pad_sec=SPEECH_PAD_SEC,
+                scene=self.current_scene,
+                capture_rate=capture_rate,
+                # streaming モードは窓を連続してつなげるので重ねない
+                overlap_sec=0 if streaming else CHUNK_OVERLAP_SEC,
+                # 無音としてスキップした範囲は処理済みとしてジャーナルに記録する（再開時に文字起こししない）
+                on_skip=self.journal_covered,
+            )
+            self.segmenter.start()
+
+            record_sec = STREAM_BLOCK_SEC if streaming else RECORD_SEC
+            blocksize = int(record_sec * capture_rate)
 
             self.stream = sd.InputStream(callback=self.audio_callback, blocksize=blocksize)
             self.stream.start()
-            print(f"{RECORD_SEC}秒間隔で録音開始...")
+            print(f"{record_sec}秒間隔で録音開始...")
 
             self.thread = threading.Thread(target=self.transcribe_worker, daemon=True)
             self.thread.start()
@@ -209,9 +665,9 @@ class MojiOkoshi:
             print(f"録音開始エラー: {e}")
             # --- vvv 変更点 vvv ---
             # エラー発生時にファイルが開いていれば閉じる
-            if self.wav_writer:
-                self.wav_writer.close()
-                self.wav_writer = None
+            if self.archiver:
+                self.archiver.close()
+                self.archiver = None
             # --- ^^^ 変更点 ^^^ ---
             raise
 
@@ -224,24 +680,40 @@ class MojiOkoshi:
             print("録音ストリームを停止しました。")
             
         # 録音ファイルを閉じる
-        if self.wav_writer:
+        if self.archiver:
             try:
-                self.wav_writer.close()
-                print(f"WAVデータを {self.current_wav_path} に保存完了しました。")
+                self.archiver.close()
+                stats = self.archiver.stats()
+                print(f"録音データを {self.current_wav_path} に保存完了しました。"
+                      f" ({stats['blocks_written']}ブロック, {stats['segments']}ファイル, {stats['bytes_written']}バイト,"
+                      f" 圧縮率 {stats['compression_ratio']:.2f}倍, エンコード CPU {stats['encode_cpu_sec']:.1f}秒"
+                      f" = 録音1秒あたり {stats['cpu_per_audio_sec'] * 1000:.1f}ms)")
             except Exception as e:
                 print(f"WAVファイルのクローズ中にエラーが発生しました: {e}")
             
-            self.wav_writer = None
+            self.archiver = None
             self.current_wav_path = None
 
-        if self.partial_audio_buffer:
-            print(f"残りの音声データ ({sum(data.shape[0] for data in self.partial_audio_buffer)}フレーム) をキューに追加します。")
-            combined_data = np.concatenate(self.partial_audio_buffer, axis=0)
-            self.audio_queue.put(combined_data)
-            self.partial_audio_buffer = []
+        if self.segmenter:
+            pending = self.pending_frames()
+            if pending:
+                print(f"残りの音声データ ({pending}フレーム) をキューに追加します。")
+            self.segmenter.flush()
+            stats = self.segmenter.stats()
+            print(f"無音としてスキップした音声: {stats['skipped_sec']:.1f}秒 / 全体 {stats['total_sec']:.1f}秒"
+                  f" ({stats['segments']}区間)")
+        if self.ring_buffer and self.ring_buffer.overrun_frames:
+            print(f"⚠️ リングバッファ満杯で破棄したフレーム数: {self.ring_buffer.overrun_frames}")
 
         print("残りの文字起こし処理を待っています...")
+        self._publish_progress('stage')  # 残りの量と見込み時間を知らせる
         self.audio_queue.join()
+        spill = self.audio_queue.spill_stats()
+        if spill['total_spills']:
+            print(f"処理が追いつかずディスクに退避した音声区間: 累計 {spill['total_spills']}区間")
+        if spill['restore_errors']:
+            print(f"⚠️ 読み戻せずに文字起こしできなかった音声区間: {spill['restore_errors']}区間")
+        self.audio_queue.cleanup()
 
         self.stop_flag.set()
 
@@ -250,18 +722,93 @@ class MojiOkoshi:
             self.thread.join()
             print("スレッドが正常に終了しました。")
 
-        if self.current_text_log_path:
+        if self.text_log:
             try:
-                with open(self.current_text_log_path, "a", encoding="utf-8") as f:
-                    f.write(f"\n--- 録音停止 ---\n")
-                print(f"即時ログを {self.current_text_log_path} に保存完了しました。")
+                self.text_log.close(footer="録音停止")
+                stats = self.text_log.stats()
+                print(f"即時ログを {self.current_text_log_path} に保存完了しました。"
+                      f" ({stats['records_written']}件, 書き込みエラー {stats['write_errors']}件)")
             except Exception as e:
                 print(f"即時ログファイルの後処理エラー: {e}")
+            self.text_log = None
             self.current_text_log_path = None
 
+        if self.journal:
+            try:
+                self.journal.close()
+            except Exception as e:
+                print(f"ジャーナルの後処理エラー: {e}")
+            self.journal = None
+
         self.update_progress('saving', self.processing_progress['total_items'], self.processing_progress['total_items'])
         print("録音停止処理が完了しました。")
 
+    def start_metrics_server(self):
+        """METRICS_PORT が設定されていれば動作状況の公開を開始する（録音を止めても公開し続ける）"""
+        if METRICS_PORT is None or self.metrics_server is not None:
+            return
+        try:
+            server = MetricsServer(self.metrics, host=METRICS_HOST, port=METRICS_PORT)
+            server.start()
+            self.metrics_server = server
+            print(f"動作状況を http://{METRICS_HOST}:{server.port}/metrics で公開しています。")
+        except Exception as e:
+            print(f"動作状況の公開を開始できませんでした: {e}")
+
+    def metrics(self):
+        """動作状況の一覧（MetricsServer が公開する）"""
+        latency = self.inference_latency.snapshot()
+        queued_sec = self.audio_queue.queued_frames() / TARGET_SR
+        spill = self.audio_queue.spill_stats()
+        pending_sec = self.pending_frames() / self.capture_rate if self.capture_rate else 0.0
+        archiver = self.archiver
+        text_log = self.text_log
+        ring = self.ring_buffer
+        return [
+            ("mojiokoshi_queue_chunks", "gauge", "文字起こし待ちの区間数", self.audio_queue.qsize()),
+            ("mojiokoshi_buffered_seconds", "gauge", "まだ文字起こししていない音声の長さ（秒）",
+             [({'stage': "queued"}, queued_sec), ({'stage': "unsegmented"}, pending_sec)]),
+            ("mojiokoshi_queue_memory_limit_seconds", "gauge", "文字起こし待ちの音声をメモリに置く上限（秒、0: 上限なし）",
+             spill['memory_limit_frames'] / TARGET_SR),
+            ("mojiokoshi_queue_memory_seconds", "gauge", "メモリ上にある文字起こし待ちの音声（秒）",
+             spill['memory_frames'] / TARGET_SR),
+            ("mojiokoshi_queue_spilled_chunks", "gauge", "ディスクに退避中の区間数", spill['spilled_chunks']),
+            ("mojiokoshi_queue_spilled_bytes", "gauge", "ディスクに退避中の音声のバイト数", spill['spilled_bytes']),
+            ("mojiokoshi_queue_spills_total", "counter", "ディスクに退避した区間の累計", spill['total_spills']),
+            ("mojiokoshi_queue_restore_errors_total", "counter", "退避した音声を読み戻せなかった区間の累計",
+             spill['restore_errors']),
+            ("mojiokoshi_inference_chunks_total", "counter", "文字起こしした区間数", latency['count']),
+            ("mojiokoshi_inference_seconds_total", "counter", "文字起こしにかかった時間の合計（秒）", latency['sum']),
+            ("mojiokoshi_inference_seconds_max", "gauge", "区間ごとの文字起こし時間の最大（秒）", latency['max']),
+            ("mojiokoshi_inference_seconds_last", "gauge", "直近の区間の文字起こし時間（秒）", latency['last']),
+            ("mojiokoshi_realtime_factor", "gauge", "文字起こし時間 ÷ 音声の長さ（1 を超えると追いつけていない）",
+             [({'window': "last"}, self.inference_latency.last_rtf), ({'window': "total"}, self.inference_latency.rtf())]),
+            ("mojiokoshi_callback_status_total", "counter", "録音コールバックの status フラグの回数",
+             [({'flag': flag}, self.callback_status_counts.get(flag, 0)) for flag in CALLBACK_STATUS_FLAGS]),
+            ("mojiokoshi_ring_overrun_frames_total", "counter", "リングバッファ満杯で破棄したフレーム数",
+             ring.overrun_frames if ring else 0),
+            ("mojiokoshi_archive_backlog_frames", "gauge", "録音ファイルへの書き込み待ちのフレーム数",
+             archiver.backlog_frames() if archiver else 0),
+            ("mojiokoshi_archive_dropped_frames_total", "counter", "録音ファイルの保存が追いつかず破棄したフレーム数",
+             archiver.dropped_frames if archiver else 0),
+            ("mojiokoshi_text_log_backlog", "gauge", "即時ログの書き込み待ちの件数", text_log.backlog() if text_log else 0),
+            ("mojiokoshi_text_log_write_seconds_max", "gauge", "即時ログの書き込みまでの時間の最大（秒）",
+             text_log.write_latency.max if text_log else 0),
+            ("mojiokoshi_text_log_write_seconds_last", "gauge", "直近の即時ログの書き込みまでの時間（秒）",
+             text_log.write_latency.last if text_log else 0),
+            ("mojiokoshi_model_load_seconds", "gauge", "モデルの読み込みとウォームアップにかかった時間（秒）",
+             self.model_load_sec or 0),
+            ("mojiokoshi_model", "gauge", "文字起こしに使っているモデル（該当するモデルが 1）",
+             [({'model': self.model_name()}, 1)]),
+            ("mojiokoshi_model_switches_total", "counter", "処理速度に合わせてモデルを切り替えた回数",
+             len(self.model_controller.switches) if self.model_controller else 0),
+            ("mojiokoshi_model_ready", "gauge", "モデルの準備ができていれば 1", int(self.backend is not None)),
+            ("mojiokoshi_recording", "gauge", "録音中なら 1",
+             int(getattr(self, 'stream', None) is not None and self.stream.active)),
+            ("mojiokoshi_stage", "gauge", "処理の段階（該当する段階が 1）",
+             [({'stage': self.processing_progress['current_stage']}, 1)]),
+        ]
+
     def save(self, filename):
         with open(filename, "w", encoding="utf-8") as f:
             f.write("\n".join(self.text_results)) 
@@ -278,62 +825,164 @@ class MojiOkoshi:
             print(f"⚠️ シーン名 '{scene_title}' は既に存在します。別の名前を入力してください。")
             return False
 
-        # ★前シーンの未処理バッファとキューをバックグラウンドで文字起こしして反映
+        # ★切り替え時点で音声区間を閉じ、それまでのデータは前シーン名を付けてキューに送る
+        # 文字起こしは transcribe_worker が1か所で行い（SCHEDULE_POLICY に従い現在のシーンを優先）、
+        # 結果は区間に付いたシーンに反映される
         prev_scene = self.current_scene
-        # Deep copy buffer and queue items for async processing
-        # 未処理のバッファとキューのデータを取得
-        old_buffer = self.partial_audio_buffer
-        old_queue = self.audio_queue
-
-        # 新しいキューとバッファをアトミックに設定
-        self.partial_audio_buffer = []
-        self.audio_queue = queue.Queue()
-        
-        # 新しいシーンに切り替え
-        self.current_scene = scene_title
-        self.scene_transcriptions[scene_title] = []
-
-        # 古いデータがあればバックグラウンド処理を開始
-        if old_buffer or not old_queue.empty():
-            queue_items = []
-            while not old_queue.empty():
-                try:
-                    queue_items.append(old_queue.get_nowait())
-                except queue.Empty:
-                    break
-            
-            threading.Thread(
-                target=self.process_scene_async,
-                args=(prev_scene, old_buffer, queue_items),
-                daemon=True
-            ).start()
-            print(f"シーン '{prev_scene}' の未処理データをバックグラウンドで処理開始。")
+        with self.scene_lock:
+            if self.segmenter and self.ring_buffer:
+                self.segmenter.cut_scene(self.ring_buffer.write_position, scene_title)
+                print(f"シーン '{prev_scene}' の未処理データを区切りました。")
+                if self.journal:
+                    self.journal.scene(scene_title, self.ring_buffer.write_position - self.segmenter.capture_start)
+            # 新しいシーンに切り替え
+            self.current_scene = scene_title
+            self.scene_transcriptions[scene_title] = []
 
         print(f"\n🎬 シーン切り替え → {scene_title}")
         return True
 
-    def add_transcription(self, text: str):
-        """文字起こし結果を現在のシーンに追加"""
-        if self.current_scene not in self.scene_transcriptions:
-            self.scene_transcriptions[self.current_scene] = []
-        self.scene_transcriptions[self.current_scene].append(text)
-        print(f"シーン '{self.current_scene}' にテキストを追加: '{text[:50]}...'")
+    def add_transcription(self, text: str, scene: str = None, lane: str = None, chunk=None, processing_sec=None,
+                          model=None):
+        """
+        文字起こし結果をシーンに追加（scene 省略時は現在のシーン）。
+        lane（マイク/リモート）が指定されていればテキストの先頭にラベルを付ける。
+        chunk（元の音声区間）、processing_sec（文字起こしにかかった秒数）、model（使ったモデル）は即時ログに記録する。
+        """
+        if scene is None:
+            scene = self.current_scene
+        journal = self.journal
+        if journal:
+            # 区間の範囲と合わせて記録し、再開時にはこの範囲を文字起こしし直さない
+            start = self.capture_frame(chunk.start) if chunk is not None else None
+            end = self.capture_frame(chunk.end) if chunk is not None else None
+            journal.text(scene, lane, text, start, end, model=model)
+        if lane is not None:
+            text = f"[{LANE_LABELS.get(lane, lane)}] {text}"
+        with self.transcription_lock:
+            if scene not in self.scene_transcriptions:
+                self.scene_transcriptions[scene] = []
+            self.scene_transcriptions[scene].append(text)
+        print(f"シーン '{scene}' にテキストを追加: '{text[:50]}...'")
+        self._notify_transcription({'type': 'committed', 'scene': scene, 'text': text, 'lane': lane})
 
-        if self.current_text_log_path:
+        text_log = self.text_log
+        if text_log:
+            # 書き込みはログのスレッドで行う（ここではキューに入れるだけ）
+            start_sec = chunk.start / TARGET_SR if chunk is not None else None
+            end_sec = chunk.end / TARGET_SR if chunk is not None else None
+            text_log.write(text, scene=scene, lane=lane, start_sec=start_sec, end_sec=end_sec,
+                           processing_sec=processing_sec, model=model)
+    
+    def add_transcription_listener(self, listener):
+        """
+        文字起こし結果の通知先を登録する。
+        listener(event) は文字起こしスレッドから呼ばれる。event は
+        {'type': 'committed' または 'tentative', 'scene': シーン名, 'text': テキスト, 'lane': レーン名}
+        - committed: シーンに追加された確定テキスト
+        - tentative: streaming モードの未確定テキスト（前回の tentative を置き換える）
+        """
+        self.transcription_listeners.append(listener)
+
+    def publish_tentative(self, scene, text, lane=None):
+        """streaming モードの未確定テキストを通知"""
+        self._notify_transcription({'type': 'tentative', 'scene': scene, 'text': text, 'lane': lane})
+
+    def _notify_transcription(self, event):
+        for listener in list(self.transcription_listeners):
             try:
-                # "a" (append) モードでファイルを開き、テキストを追記
-                with open(self.current_text_log_path, "a", encoding="utf-8") as f:
-                    f.write(text + "\n")
+                listener(event)
             except Exception as e:
-                print(f"ログファイルへの書き込みエラー: {e}")
-    
+                print(f"文字起こし結果の通知エラー: {e}")
+
     def update_progress(self, stage: str, processed: int = None, total: int = None):
-        """処理進行状況を更新"""
+        """処理進行状況を更新（段階が変わったら通知する）"""
+        changed = self.processing_progress['current_stage'] != stage
         self.processing_progress['current_stage'] = stage
         if processed is not None:
             self.processing_progress['processed_items'] = processed
         if total is not None:
             self.processing_progress['total_items'] = total
+        if changed:
+            self._publish_progress('stage')
+
+    def add_progress_listener(self, listener):
+        """
+        進行状況の通知先を登録する。listener(event) は文字起こしスレッドなどから呼ばれる。event は
+        {'type': 'chunk_start'/'chunk_done'/'stage'/'model', 'stage': 段階, 'processed': 完了した区間数,
+         'total': 完了・処理中・待ちの区間数, 'done_sec': 文字起こし済みの音声（秒）, 'remaining_sec': 残りの音声（秒）,
+         'eta_sec': 残りを処理し終えるまでの見込み（秒、計測前は None）, 'percent': 音声の長さでの進み具合}
+        - chunk_start: 区間（まとめて処理する場合は複数、'chunks' に数）の文字起こしを開始した
+        - chunk_done: 区間の文字起こしが終わった（'scene' にシーン名）
+        - stage: 段階が変わった（停止時の残りの処理の開始も含む）
+        - model: モデルの読み込みが終わった（'ready'、'error'、'load_sec'）
+        """
+        self.progress_listeners.append(listener)
+
+    def reset_progress(self):
+        """進行状況と処理速度の計測を新しいセッション用に戻す"""
+        with self.progress_lock:
+            self.processing_progress.update(total_items=0, processed_items=0, current_stage='idle')
+            self.throughput = ThroughputEstimator()
+            self.in_flight_chunks = 0
+            self.in_flight_frames = 0
+            self.completed_chunks = 0
+            self.done_audio_sec = 0.0
+        self._publish_progress('stage')
+
+    def remaining_audio_sec(self):
+        """まだ文字起こしが終わっていない音声の長さ（処理中・キュー・未切り出しの合計、秒）"""
+        pending = self.pending_frames() / self.capture_rate if self.capture_rate else 0.0
+        return (self.in_flight_frames + self.audio_queue.queued_frames()) / TARGET_SR + pending
+
+    def _chunks_started(self, chunks):
+        with self.progress_lock:
+            self.in_flight_chunks += len(chunks)
+            self.in_flight_frames += sum(chunk.frames for chunk in chunks)
+            self.processing_progress['total_items'] = (self.completed_chunks + self.in_flight_chunks
+                                                       + self.audio_queue.qsize())
+        if self.processing_progress['current_stage'] != 'transcribing':
+            self.update_progress('transcribing')
+        self._publish_progress('chunk_start', chunks=len(chunks))
+
+    def _chunk_done(self, chunk, started=None):
+        """区間の文字起こしが終わった（started は処理を始めた時刻。None なら処理速度は呼び出し側で記録済み）"""
+        if started is not None:
+            self.throughput.observe(chunk.frames / TARGET_SR, started, time.perf_counter())
+        with self.progress_lock:
+            self.in_flight_chunks -= 1
+            self.in_flight_frames -= chunk.frames
+            self.completed_chunks += 1
+            self.done_audio_sec += chunk.frames / TARGET_SR
+            self.processing_progress['processed_items'] = self.completed_chunks
+            self.processing_progress['total_items'] = (self.completed_chunks + self.in_flight_chunks
+                                                       + self.audio_queue.qsize())
+            caught_up = self.in_flight_chunks == 0 and self.audio_queue.empty()
+        self._publish_progress('chunk_done', scene=chunk.scene)
+        if caught_up and self.processing_progress['current_stage'] == 'transcribing':
+            self.update_progress('idle')
+
+    def _publish_progress(self, event_type, **fields):
+        if not self.progress_listeners:
+            return
+        remaining = self.remaining_audio_sec()
+        done = self.done_audio_sec
+        event = {
+            'type': event_type,
+            'stage': self.processing_progress['current_stage'],
+            'processed': self.processing_progress['processed_items'],
+            'total': self.processing_progress['total_items'],
+            'done_sec': done,
+            'remaining_sec': remaining,
+            'eta_sec': self.throughput.eta(remaining),
+            'percent': int(done * 100 / (done + remaining)) if done + remaining > 0 else 100,
+        }
+        event.update(fields)
+        for listener in list(self.progress_listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"進行状況の通知エラー: {e}")
     
     def get_progress_percentage(self):
         """進行状況のパーセンテージを取得"""
@@ -366,77 +1015,18 @@ class MojiOkoshi:
             # scenesに追加
             self.scenes[scene] = "\n".join(clean_texts)
 
+    def reset_results(self):
+        """前のセッションの文字起こし結果を捨てて、次の録音をデフォルトのシーンから始める（録音停止中に呼ぶ）"""
+        with self.transcription_lock:
+            self.text_results = []
+            self.scene_transcriptions = {}
+            self.scenes = {}
+        self.current_scene = "default"
+
     @property
     def transcription(self):
         return "\n".join(self.text_results)
     
-    def get_initial_scene_name(self, parent_window=None):
-        """最初のシーン名を入力するダイアログを表示"""
-        # ダイアログウィンドウを作成
-        dialog = tk.Toplevel(parent_window) if parent_window else tk.Tk()
-        dialog.title("シーン名を入力")
-        dialog.geometry("400x150")
-        dialog.resizable(False, False)
-        
-        # メインウィンドウを一時的に無効化
-        if parent_window:
-            dialog.transient(parent_window)
-            dialog.grab_set()
-            # ダイアログを中央に配置
-            dialog.geometry("+%d+%d" % (parent_window.winfo_rootx() + 50, parent_window.winfo_rooty() + 50))
-        
-        # ラベル
-        label = tk.Label(dialog, text="最初のシーン名を入力してください:", font=("Arial", 12))
-        label.pack(pady=20)
-        
-        # 入力フィールド
-        entry = tk.Entry(dialog, width=30, font=("Arial", 11))
-        entry.pack(pady=10)
-        entry.focus()  # フォーカスを設定
-        
-        # ボタンフレーム
-        button_frame = tk.Frame(dialog)
-        button_frame.pack(pady=10)
-        
-        result = {"scene_name": None}
-        
-        def on_ok():
-            scene_name = entry.get().strip()
-            if scene_name:
-                result["scene_name"] = scene_name
-                self.switch_scene(scene_name)
-                dialog.destroy()
-            else:
-                messagebox.showwarning("警告", "シーン名を入力してください。")
-        
-        def on_cancel():
-            # デフォルトシーンを使用
-            result["scene_name"] = "default"
-            self.switch_scene("default")
-            dialog.destroy()
-        
-        # OKボタン
-        ok_button = tk.Button(button_frame, text="OK", command=on_ok, width=10)
-        ok_button.pack(side=tk.LEFT, padx=5)
-        
-        # キャンセルボタン
-        cancel_button = tk.Button(button_frame, text="デフォルト", command=on_cancel, width=10)
-        cancel_button.pack(side=tk.LEFT, padx=5)
-        
-        # EnterキーでOK
-        entry.bind('<Return>', lambda e: on_ok())
-        
-        # Escapeキーでキャンセル
-        dialog.bind('<Escape>', lambda e: on_cancel())
-        
-        # ダイアログが閉じられるまで待機
-        if parent_window:
-            dialog.wait_window()
-        else:
-            dialog.mainloop()
-        
-        return result["scene_name"]
-    
     def save_combined_scenario(self, scenario_title, output_dir=None):
         """
         全シーンをまとめて1つのテキストファイルに保存。
@@ -475,79 +1065,3 @@ class MojiOkoshi:
 
         print(f"全シーン結合テキスト保存完了: {combined_file_path}")
         return combined_file_path
-    
-    def process_partial_buffer_for_scene(self):
-        """現在のシーンに対して、未処理バッファとキューのデータを文字起こしして追加"""
-        # バッファを処理
-        if self.partial_audio_buffer:
-            combined_data = np.concatenate(self.partial_audio_buffer, axis=0)
-            mono = np.mean(combined_data, axis=1) if combined_data.ndim > 1 else combined_data.flatten()
-            if mono.size > 0:
-                resampled = librosa.resample(mono, orig_sr=SAMPLE_RATE, target_sr=TARGET_SR)
-                resampled = np.clip(resampled * 1.3, -1.0, 1.0)
-                try:
-                    result = self.model.transcribe(resampled, language=LANGUAGE)
-                    text = result["text"]
-                    self.add_transcription(text)
-                except Exception as e:
-                    text = f"[文字起こしエラー: {str(e)[:50]}...]"
-                    self.add_transcription(text)
-            self.partial_audio_buffer = []
-
-        # キューを処理
-        while not self.audio_queue.empty():
-            try:
-                data = self.audio_queue.get_nowait()
-                mono = np.mean(data, axis=1) if data.ndim > 1 else data.flatten()
-                if mono.size > 0:
-                    resampled = librosa.resample(mono, orig_sr=SAMPLE_RATE, target_sr=TARGET_SR)
-                    resampled = np.clip(resampled * 1.3, -1.0, 1.0)
-                    try:
-                        result = self.model.transcribe(resampled, language=LANGUAGE)
-                        text = result["text"]
-                        self.add_transcription(text)
-                    except Exception as e:
-                        text = f"[文字起こしエラー: {str(e)[:50]}...]"
-                        self.add_transcription(text)
-                self.audio_queue.task_done()
-            except queue.Empty:
-                break
-    def process_scene_async(self, scene_name, buffer_data, queue_data):
-        """バックグラウンドでシーンのバッファとキューを文字起こしして追加"""
-        texts_to_add = []
-        
-        # バッファデータ処理
-        if buffer_data:
-            try:
-                combined_data = np.concatenate(buffer_data, axis=0)
-                mono = np.mean(combined_data, axis=1) if combined_data.ndim > 1 else combined_data.flatten()
-                if mono.size > 0:
-                    resampled = librosa.resample(mono, orig_sr=SAMPLE_RATE, target_sr=TARGET_SR)
-                    resampled = np.clip(resampled * 1.3, -1.0, 1.0)
-                    result = self.model.transcribe(resampled, language=LANGUAGE)
-                    texts_to_add.append(result["text"])
-            except Exception as e:
-                texts_to_add.append(f"[文字起こしエラー: {str(e)[:50]}...]")
-                print(f"[バックグラウンドバッファ処理エラー: {e}]")
-
-        # キューデータ処理
-        for data in queue_data:
-            try:
-                mono = np.mean(data, axis=1) if data.ndim > 1 else data.flatten()
-                if mono.size > 0:
-                    resampled = librosa.resample(mono, orig_sr=SAMPLE_RATE, target_sr=TARGET_SR)
-                    resampled = np.clip(resampled * 1.3, -1.0, 1.0)
-                    result = self.model.transcribe(resampled, language=LANGUAGE)
-                    texts_to_add.append(result["text"])
-            except Exception as e:
-                texts_to_add.append(f"[文字起こしエラー: {str(e)[:50]}...]")
-                print(f"[バックグラウンドキュー処理エラー: {e}]")
-
-        # スレッドセーフに文字起こし結果を更新
-        if texts_to_add:
-            with self.transcription_lock:
-                if scene_name not in self.scene_transcriptions:
-                    self.scene_transcriptions[scene_name] = []
-                self.scene_transcriptions[scene_name].extend(texts_to_add)
-                
-        print(f"シーン '{scene_name}' のバックグラウンド処理が完了しました。")
\ No newline at end of file
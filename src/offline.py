@@ -0,0 +1,199 @@
+"""
+録音ファイルからの文字起こし（GUI なし）。
+
+録音（WAV、または AudioArchiver の索引）を READ_BLOCK_SEC ごとに読み込みながら、録音時と同じ区間切り出し・前処理・文字起こしを行う。
+ファイル全体をメモリに読み込むことはない。
+- transcribe_files(): 複数のファイルをプロセスに分けて並列に処理し、ファイルごとの実時間比を表示する
+- resume.py（落ちたセッションの再開）も同じ処理を使う
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import mojiokoshi
+from archiver import open_archive, archive_stem
+from backends import create_backend
+from journal import load_journal, journal_path_for
+from merge import OverlapMerger
+from ring_buffer import AudioRingBuffer
+from segmenter import VadSegmenter, LANES
+from vad import create_vad
+from worker_pool import configure_threads
+
+READ_BLOCK_SEC = 5   # WAV を読み込む単位
+
+# ワーカープロセス内のアプリ（モデルを読み込み済み）
+_worker_app = None
+
+
+def iter_chunks(wav, lane_channels, start, end, scene):
+    """
+    WAV の範囲 [start, end) を録音時と同じ方法で区間に切り出し、切り出せた順に返す。
+    区間の位置 (start/end) は WAV のフレーム位置に直してある
+    """
+    samplerate = wav.samplerate
+    chunks = []
+    ring = AudioRingBuffer(int(READ_BLOCK_SEC * samplerate) * 2, wav.channels)
+    segmenter = VadSegmenter(
+        ring,
+        chunks.append,
+        mojiokoshi.TARGET_SR,
+        vad=create_vad(mojiokoshi.VAD_MODE, mojiokoshi.TARGET_SR),
+        lanes=[lane_channels],
+        min_segment_sec=mojiokoshi.MIN_SEGMENT_SEC,
+        max_segment_sec=mojiokoshi.BUFFER_SEC,
+        min_silence_sec=mojiokoshi.MIN_SILENCE_SEC,
+        max_silence_sec=mojiokoshi.MAX_SILENCE_SEC,
+        speech_pad_sec=mojiokoshi.SPEECH_PAD_SEC,
+        scene=scene,
+        capture_rate=samplerate,
+        overlap_sec=mojiokoshi.CHUNK_OVERLAP_SEC,
+    )
+
+    def take():
+        for chunk in chunks:
+            chunk.start = start + chunk.start * samplerate // mojiokoshi.TARGET_SR
+            chunk.end = start + chunk.end * samplerate // mojiokoshi.TARGET_SR
+        taken = list(chunks)
+        chunks.clear()
+        return taken
+
+    wav.seek(start)
+    block = int(READ_BLOCK_SEC * samplerate)
+    position = start
+    while position < end:
+        data = wav.read(min(block, end - position), dtype="float32", always_2d=True)
+        if not len(data):
+            break
+        ring.write(data)
+        segmenter.process()
+        position += len(data)
+        yield from take()
+    segmenter.flush()
+    yield from take()
+
+
+def transcribe_range(app, merger, wav, lane_channels, start, end, scene):
+    """WAV の範囲を文字起こしし、(区間, テキスト) を録音順に返す（MAX_BATCH_SIZE ずつまとめて推論する）"""
+    batch = []
+
+    def decode():
+        results = app.transcribe_audio_batch([app.preprocess(chunk.audio) for chunk in batch])
+        decoded = [(chunk, merger.merge(chunk, result)) for chunk, result in zip(batch, results)]
+        batch.clear()
+        return decoded
+
+    for chunk in iter_chunks(wav, lane_channels, start, end, scene):
+        batch.append(chunk)
+        if len(batch) >= mojiokoshi.MAX_BATCH_SIZE:
+            yield from decode()
+    if batch:
+        yield from decode()
+
+
+def save_outputs(app, scenes, texts, title, output_dir=None, scenario_dir=None):
+    """
+    文字起こし結果をシーンの順（シーン内は録音位置の順）に並べ、シーンごとの出力と結合シナリオを保存する。
+    texts は [(シーン名, レーン, テキスト, 開始フレーム or None)]。位置のない行は直前の行の位置に続ける
+    """
+    scene_order = {scene: i for i, scene in enumerate(scenes)}
+    entries = []
+    last_start = {}
+    for order, (scene, lane, text, start) in enumerate(texts):
+        if start is None:
+            start = last_start.get(scene, 0)
+        last_start[scene] = start
+        entries.append((scene_order.get(scene, len(scene_order)), start, order, scene, lane, text))
+    entries.sort(key=lambda entry: entry[:3])
+
+    app.scene_transcriptions = {scene: [] for scene in scenes}
+    app.text_results = []
+    for *_, scene, lane, text in entries:
+        if not text:
+            continue
+        if lane is not None:
+            text = f"[{mojiokoshi.LANE_LABELS.get(lane, lane)}] {text}"
+        app.scene_transcriptions.setdefault(scene, []).append(text)
+        app.text_results.append(text)
+    app.save_all_scenes(output_dir)
+    return app.save_combined_scenario(title, scenario_dir)
+
+
+def transcribe_file(app, path, output_dir=None, scenario_dir=None):
+    """
+    1つの録音を文字起こしし、シーンごとの出力と結合シナリオを保存する。
+    隣にジャーナルがあれば、そのシーン区切りとレーン設定を使う（なければファイル名を1つのシーンとする）
+    """
+    started = time.perf_counter()
+    title = os.path.basename(archive_stem(path))
+    journal = journal_path_for(path)
+    state = load_journal(journal) if os.path.exists(journal) else None
+    lanes = LANES.get(state.lane_mode if state else mojiokoshi.LANE_MODE, LANES["mixed"])
+    merger = OverlapMerger(mojiokoshi.TARGET_SR, mojiokoshi.LANGUAGE, mojiokoshi.CHUNK_OVERLAP_SEC)
+    texts = []
+    chunks = 0
+    with open_archive(path) as wav:
+        audio_sec = wav.frames / wav.samplerate
+        spans = state.scene_spans(wav.frames) if state else [(title, 0, wav.frames)]
+        for scene, start, end in spans:
+            for lane, channels in lanes:
+                for chunk, text in transcribe_range(app, merger, wav, (lane, channels), start, end, scene):
+                    texts.append((scene, lane, text, chunk.start))
+                    chunks += 1
+    scenario = save_outputs(app, [scene for scene, _, _ in spans], texts, title,
+                            os.path.join(output_dir or os.path.join("log", "output"), title), scenario_dir)
+    elapsed = time.perf_counter() - started
+    return {
+        'path': path,
+        'scenario': scenario,
+        'chunks': chunks,
+        'audio_sec': audio_sec,
+        'elapsed_sec': elapsed,
+        'rtf': elapsed / audio_sec if audio_sec else 0.0,
+    }
+
+
+def _init_worker(threads):
+    global _worker_app
+    configure_threads(threads)
+    options = mojiokoshi.BACKEND_OPTIONS.get(mojiokoshi.BACKEND, {})
+    if mojiokoshi.BACKEND == "faster-whisper" and threads:
+        options = dict(options, cpu_threads=threads)
+    _worker_app = mojiokoshi.MojiOkoshi()
+    _worker_app.backend = create_backend(mojiokoshi.BACKEND, mojiokoshi.MODEL_SIZE, **options)
+    _worker_app.model_ready.set()
+
+
+def _transcribe_file(path, output_dir, scenario_dir):
+    return transcribe_file(_worker_app, path, output_dir, scenario_dir)
+
+
+def transcribe_files(paths, workers=None, output_dir=None, scenario_dir=None):
+    """
+    複数の WAV を文字起こしする。ファイルごとにワーカープロセスへ割り振り、各ワーカーは自分のモデルを持つ。
+    workers 省略時はファイル数と (コア数 ÷ 4) の小さいほう（ワーカーごとにモデルを読み込むのでメモリに注意）
+    """
+    workers = workers or max(1, min(len(paths), (os.cpu_count() or 1) // 4))
+    threads = mojiokoshi.THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // workers)
+    print(f"{len(paths)}ファイルを {workers} プロセス (各 {threads} スレッド) で文字起こしします "
+          f"({mojiokoshi.MODEL_SIZE}, {mojiokoshi.BACKEND})")
+    reports = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(threads,)) as executor:
+        futures = {executor.submit(_transcribe_file, path, output_dir, scenario_dir): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                print(f"❌ {path}: {e}")
+                continue
+            reports.append(report)
+            print(f"✅ {path}: 音声 {report['audio_sec']:.1f}秒 / 処理 {report['elapsed_sec']:.1f}秒"
+                  f" (実時間比 {report['rtf']:.2f}, {report['chunks']}区間) → {report['scenario']}")
+    elapsed = time.perf_counter() - started
+    audio_sec = sum(report['audio_sec'] for report in reports)
+    if audio_sec:
+        print(f"合計: 音声 {audio_sec:.1f}秒 / 経過 {elapsed:.1f}秒 (全体の実時間比 {elapsed / audio_sec:.2f})")
+    return reports
@@ -0,0 +1,150 @@
+"""
+log/scenario_log の後処理（改行の挿入・削除）をまとめて実行する。
+
+- 処理済みのファイルはマニフェスト（サイズ・更新時刻・内容のハッシュ）に記録し、新しいか変更されたファイルだけを処理する
+  （更新時刻が変わっていても内容が同じならハッシュで判断して飛ばす）
+- ファイルはプロセスプールで並列に処理する
+- 出力は一時ファイルに書いてから名前を変えるので、途中で止まっても書きかけのファイルは残らない
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from formatter import format_stream, BLOCK_SIZE
+
+# 処理の種類 -> (改行の挿入に使う言語、None なら改行の削除)
+OPERATIONS = {
+    "newlines-ja": "ja",
+    "newlines-en": "en",
+    "remove-newlines": None,
+}
+MANIFEST_NAME = ".manifest-{operation}.json"
+
+
+def file_hash(path):
+    """ファイル内容の SHA-256（少しずつ読み込む）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_write(path, pieces):
+    """pieces（文字列の列）を一時ファイルに書き、書き終わったら path に置き換える"""
+    directory = os.path.dirname(path) or "."
+    descriptor, temporary = tempfile.mkstemp(prefix=".tmp-", suffix=".txt", dir=directory)
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            for piece in pieces:
+                f.write(piece)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp は所有者のみ読み書きできるファイルを作るので、元のファイルの権限に合わせる
+        os.chmod(temporary, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def read_blocks(path):
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter(lambda: f.read(BLOCK_SIZE), "")
+
+
+def process_file(operation, source_path, output_path, morphology=False):
+    """1ファイルを処理する（ワーカープロセスで実行）"""
+    language = OPERATIONS[operation]
+    if language is None:
+        pieces = (block.replace("\n", "") for block in read_blocks(source_path))
+    else:
+        pieces = format_stream(read_blocks(source_path), language, morphology)
+    atomic_write(output_path, pieces)
+    return output_path
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    atomic_write(path, [json.dumps(manifest, ensure_ascii=False, indent=1)])
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def find_changed(source_dir, manifest):
+    """新しいか変更された .txt ファイル名とそのハッシュの一覧、および .txt ファイルの総数"""
+    changed = []
+    total = 0
+    for name in sorted(os.listdir(source_dir)):
+        path = os.path.join(source_dir, name)
+        if not name.endswith(".txt") or name.startswith(".tmp-") or not os.path.isfile(path):
+            continue
+        total += 1
+        entry = manifest.get(name)
+        signature = _signature(path)
+        if entry and entry['size'] == signature['size'] and entry['mtime_ns'] == signature['mtime_ns']:
+            continue
+        digest = file_hash(path)
+        if entry and entry['sha256'] == digest:
+            entry.update(signature)  # 内容は同じ（更新時刻だけ変わった）
+            continue
+        changed.append((name, digest))
+    return changed, total
+
+
+def run(operation, source_dir, output_dir=None, workers=None, morphology=False):
+    """
+    source_dir の .txt を operation で処理して output_dir に書き出す（output_dir 省略時はその場で書き換える）。
+    処理したファイル名の一覧を返す
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"不明な後処理です: {operation} (選択肢: {', '.join(OPERATIONS)})")
+    if not os.path.isdir(source_dir):
+        print(f"❌ {source_dir} が見つかりません")
+        return []
+    in_place = output_dir is None
+    output_dir = source_dir if in_place else output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME.format(operation=operation))
+    manifest = load_manifest(manifest_path)
+
+    changed, total = find_changed(source_dir, manifest)
+    print(f"{source_dir}: {len(changed)}ファイルを処理します（変更なし {total - len(changed)}ファイル）")
+    processed = []
+    if changed:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(workers, len(changed)),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {
+                name: executor.submit(process_file, operation, os.path.join(source_dir, name),
+                                      os.path.join(output_dir, name), morphology)
+                for name, _ in changed
+            }
+            for name, digest in changed:
+                try:
+                    output_file = futures[name].result()
+                except Exception as e:
+                    print(f"❌ {name}: {e}")
+                    continue
+                source_path = os.path.join(source_dir, name)
+                # その場で書き換えた場合は書き換え後の内容を記録する（次回は処理済みとして飛ばす）
+                manifest[name] = dict(_signature(source_path), sha256=file_hash(source_path) if in_place else digest)
+                processed.append(name)
+                print(f"✅ {output_file}")
+        save_manifest(manifest_path, manifest)
+    elif manifest:
+        save_manifest(manifest_path, manifest)
+    return processed
@@ -0,0 +1,68 @@
+import math
+import numpy as np
+
+
+class StreamingResampler:
+    """
+    ブロックごとに呼べる状態付きのポリフェーズ・リサンプラー。
+    - フィルタの履歴をブロック間で持ち越すので、区切り方に関係なく連続した出力になる
+    - 入力 n サンプル目は出力 n * target / source サンプル目に対応する（フィルタ遅延は補正済み）
+    - 最後に process(..., final=True) を呼ぶと残りを出力し、合計 ceil(N * target / source) サンプルになる
+    """
+
+    def __init__(self, source_rate, target_rate, half_taps=10, beta=5.0):
+        from scipy.signal import firwin
+
+        g = math.gcd(int(source_rate), int(target_rate))
+        self.up = int(target_rate) // g
+        self.down = int(source_rate) // g
+        max_rate = max(self.up, self.down)
+        # scipy.signal.resample_poly と同じ設計のローパスフィルタ
+        h = firwin(2 * half_taps * max_rate + 1, 1.0 / max_rate, window=('kaiser', beta)) * self.up
+        self.delay = (len(h) - 1) // 2
+        self.taps = -(-len(h) // self.up)
+        padded = np.zeros(self.taps * self.up)
+        padded[:len(h)] = h
+        # phases[p, j] = h[p + j * up]
+        self.phases = padded.reshape(self.taps, self.up).T.astype(np.float32)
+
+        self.input_count = 0                                # これまでの入力サンプル数
+        self.output_count = 0                               # これまでの出力サンプル数
+        self.buffer = np.zeros(self.taps, dtype=np.float32)  # 入力の履歴（先頭は過去のゼロ）
+        self.buffer_start = -self.taps                      # buffer[0] の入力位置
+
+    def output_position(self, input_position):
+        """入力の位置に対応する出力の位置"""
+        return input_position * self.up // self.down
+
+    def process(self, x, final=False):
+        """入力ブロックを追加し、計算できるところまでの出力を返す"""
+        x = np.asarray(x, dtype=np.float32)
+        self.input_count += len(x)
+        buffer = np.concatenate((self.buffer, x)) if len(x) else self.buffer
+        available = self.input_count
+        if final:
+            # 末尾はゼロで埋めて、残りの出力をすべて計算する
+            tail = self.delay // self.up + self.taps + 1
+            buffer = np.concatenate((buffer, np.zeros(tail, dtype=np.float32)))
+            available += tail
+
+        # (k * down + delay) // up <= available - 1 を満たす k まで出力できる
+        end = (available * self.up - 1 - self.delay) // self.down + 1
+        if final:
+            end = min(end, -(-self.input_count * self.up // self.down))
+        end = max(end, self.output_count)
+        ks = np.arange(self.output_count, end, dtype=np.int64)
+        m = ks * self.down + self.delay
+        newest = m // self.up
+        phase = m - newest * self.up
+        index = (newest - self.buffer_start)[:, None] - np.arange(self.taps)[None, :]
+        output = np.einsum('ij,ij->i', buffer[index], self.phases[phase]) if len(ks) else np.zeros(0, dtype=np.float32)
+        self.output_count = end
+
+        # 次の出力に必要な分だけ履歴を残す
+        keep_from = (end * self.down + self.delay) // self.up - self.taps + 1
+        drop = min(max(keep_from - self.buffer_start, 0), self.input_count - self.buffer_start)
+        self.buffer = buffer[drop:self.input_count - self.buffer_start].copy()
+        self.buffer_start += drop
+        return output.astype(np.float32, copy=False)
@@ -0,0 +1,74 @@
+"""
+落ちたセッションの文字起こしを再開する。
+
+ジャーナル (journal.py) と log/voice/ の WAV を開き、まだ文字起こししていない範囲だけを
+録音時と同じ区間切り出し・文字起こし (offline.py) で処理してから、シーンごとの出力と結合シナリオを作り直す。
+"""
+import os
+import mojiokoshi
+from archiver import open_archive
+from journal import SessionJournal, load_journal
+from merge import OverlapMerger
+from offline import transcribe_range, save_outputs
+from segmenter import LANES
+
+MIN_GAP_SEC = 1.0    # これより短い未処理範囲（区間の前後の余白など）は文字起こししない
+
+
+def find_latest_journal(directory=None):
+    """最も新しいジャーナルのパス（なければ None）"""
+    directory = directory or os.path.join("log", "voice")
+    if not os.path.isdir(directory):
+        return None
+    journals = sorted(name for name in os.listdir(directory) if name.endswith(".journal.jsonl"))
+    return os.path.join(directory, journals[-1]) if journals else None
+
+
+def resume_session(journal_path, title=None, app=None):
+    """
+    ジャーナルの未処理範囲を文字起こしし、シーンごとの出力を作り直す。
+    新しく文字起こしした結果もジャーナルに追記するので、途中で止まっても再度実行できる。
+    正常に停止したセッション（closed）は文字起こしし直さず、出力だけを作り直す。
+    結合シナリオのファイル名は title（省略時はジャーナル名）
+    """
+    state = load_journal(journal_path)
+    lanes = LANES.get(state.lane_mode, LANES["mixed"])
+    app = app or mojiokoshi.MojiOkoshi()
+    merger = OverlapMerger(mojiokoshi.TARGET_SR, mojiokoshi.LANGUAGE, mojiokoshi.CHUNK_OVERLAP_SEC)
+    texts = list(state.texts)
+
+    with open_archive(state.wav) as wav:
+        samplerate = wav.samplerate
+        spans = state.scene_spans(wav.frames)
+        todo = [
+            (scene, lane, channels, gap)
+            for scene, start, end in spans
+            for lane, channels in lanes
+            for gap in state.missing_ranges(scene, lane, start, end, int(MIN_GAP_SEC * samplerate))
+        ]
+        missing_sec = sum(gap[1] - gap[0] for *_, gap in todo) / samplerate
+        print(f"{state.wav}: 全体 {wav.frames / samplerate:.1f}秒のうち未処理 {missing_sec:.1f}秒"
+              f" ({len(todo)}範囲, {'正常終了' if state.closed else '途中終了'}のセッション)")
+        if todo and state.closed:
+            print("正常に停止したセッションなので、未処理の範囲は文字起こしせずに出力だけを作り直します")
+        elif todo:
+            app.load_model()
+            if app.backend is None:
+                raise RuntimeError(f"モデルが読み込めません: {app.model_error}")
+            journal = SessionJournal(journal_path)
+            journal.reopen()
+            try:
+                for scene, lane, channels, (start, end) in todo:
+                    for chunk, text in transcribe_range(app, merger, wav, (lane, channels), start, end, scene):
+                        print(text)
+                        journal.text(scene, lane, text, chunk.start, chunk.end, model=app.model_name())
+                        texts.append((scene, lane, text, chunk.start))
+                    # 区間が見つからなかった部分も含めて処理済みにする
+                    journal.covered(scene, lane, start, end)
+            finally:
+                journal.close()
+            if app.pool is not None:
+                app.pool.shutdown()
+
+    title = title or os.path.basename(journal_path).split(".")[0]
+    return save_outputs(app, [scene for _, scene in state.scenes], texts, title)
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    固定長・事前確保の float32 リングバッファ。
+    - ライター (audio_callback) 1つ、リーダー (文字起こし側) 1つでの利用を想定
+    - 位置は「開始からの総フレーム数」で管理するため、残量計算は O(1)
+    - 読み出しはコピーせずにビュー (折り返し時は2つ) を返す
+    """
+
+    def __init__(self, capacity_frames: int, channels: int, dtype=np.float32):
+        self.capacity = int(capacity_frames)
+        self.channels = channels
+        self._buffer = np.zeros((self.capacity, channels), dtype=dtype)
+        # 書き込み位置はライターのみ、読み出し位置はリーダーのみが更新する
+        self._write_pos = 0
+        self._read_pos = 0
+        # 空き不足で書き込めなかったフレーム数
+        self.overrun_frames = 0
+
+    @property
+    def write_position(self):
+        """これまでに書き込んだ総フレーム数"""
+        return self._write_pos
+
+    @property
+    def read_position(self):
+        """これまでに解放した総フレーム数"""
+        return self._read_pos
+
+    def available(self):
+        """未読のフレーム数"""
+        return self._write_pos - self._read_pos
+
+    def free(self):
+        """書き込み可能なフレーム数"""
+        return self.capacity - self.available()
+
+    def write(self, data):
+        """
+        data をバッファにコピーする (ライター側)。
+        空きが足りない場合は何も書かずに 0 を返し、overrun_frames に加算する。
+        """
+        frames = data.shape[0]
+        if frames > self.free():
+            self.overrun_frames += frames
+            return 0
+        start = self._write_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        self._buffer[start:start + first] = data[:first]
+        if first < frames:
+            self._buffer[:frames - first] = data[first:]
+        # コピー完了後に位置を公開する
+        self._write_pos += frames
+        return frames
+
+    def views(self, start: int, end: int):
+        """
+        総フレーム位置 [start, end) のデータをコピーせずにビューのリストで返す (リーダー側)。
+        リングの終端をまたぐ場合はビューが2つになる。
+        """
+        if start < self._read_pos or end > self._write_pos or start > end:
+            raise ValueError(f"範囲外の読み出しです: [{start}, {end}) / 有効範囲 [{self._read_pos}, {self._write_pos})")
+        frames = end - start
+        if frames == 0:
+            return []
+        offset = start % self.capacity
+        first = min(frames, self.capacity - offset)
+        result = [self._buffer[offset:offset + first]]
+        if first < frames:
+            result.append(self._buffer[:frames - first])
+        return result
+
+    def release(self, end: int):
+        """総フレーム位置 end までを読み出し済みとして解放する (リーダー側)"""
+        if end < self._read_pos or end > self._write_pos:
+            raise ValueError(f"解放位置が不正です: {end}")
+        self._read_pos = end
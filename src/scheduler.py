@@ -0,0 +1,175 @@
+import collections
+import contextlib
+import os
+import queue
+import shutil
+import tempfile
+import numpy as np
+
+# 区間を取り出す順番
+#   "current-first": 現在のシーンの区間を先に、前のシーンの残り（バックログ）は手が空いたときに処理する
+#   "fifo": 録音順
+POLICIES = ("current-first", "fifo")
+
+
+class ChunkScheduler(queue.Queue):
+    """
+    文字起こし待ちの区間 (AudioChunk) のキュー。文字起こしはすべてここから取り出した順に1か所で行う。
+    queue.Queue と同じように使える（put/get/task_done/join/qsize）。
+    シーンごとに録音順を保ったまま、policy に従ってどのシーンの区間を先に渡すかを決める。
+    current_scene は現在のシーン名を返す関数。
+
+    memory_frames > 0 の場合、メモリ上に置く音声をそのサンプル数までに抑え、超えた分の区間の音声は
+    spill_dir（None: 一時ディレクトリ）のファイルに退避する。退避した音声は取り出すときに読み戻すので、
+    put() が待たされることはなく（録音は止めない）、取り出し側からは区別なく扱える。
+    ファイルの読み書きはキューのロックの外で行う。読み戻せなかった区間は警告を出して task_done() 済みにし、
+    次の区間を返す（join() で待っている停止処理が止まらないように）。
+    """
+
+    def __init__(self, current_scene, policy="current-first", maxsize=0, memory_frames=0, spill_dir=None):
+        if policy not in POLICIES:
+            raise ValueError(f"不明な優先順位です: {policy} (選択肢: {', '.join(POLICIES)})")
+        self.current_scene = current_scene
+        self.policy = policy
+        self.memory_limit = memory_frames
+        self.spill_root = spill_dir
+        self.spill_dir = None       # 最初に退避するときに作る
+        super().__init__(maxsize)
+
+    def put(self, chunk, block=True, timeout=None):
+        # 上限を超える分は、ロックを持つ前にファイルに書き出しておく
+        with self.mutex:
+            spill = bool(self.memory_limit and chunk.audio.size
+                         and self.memory_frames + chunk.audio.size > self.memory_limit)
+        if spill:
+            self._spill(chunk)
+        super().put(chunk, block, timeout)
+
+    def get(self, block=True, timeout=None):
+        while True:
+            chunk = super().get(block, timeout)
+            if not isinstance(chunk.audio, SpilledAudio) or self._restore(chunk):
+                return chunk
+            # 音声を失った区間は処理済みとして扱い、次の区間を待つ
+            self.task_done()
+
+    def queued_frames(self):
+        """待ち区間の音声の長さの合計（TARGET_SR のサンプル数）"""
+        with self.mutex:
+            return self.frames
+
+    def spill_stats(self):
+        """メモリの上限と、メモリ上・ディスク上にある待ち区間の音声"""
+        with self.mutex:
+            return {
+                'memory_limit_frames': self.memory_limit,
+                'memory_frames': self.memory_frames,
+                'spilled_chunks': self.spilled_chunks,
+                'spilled_frames': self.spilled_frames,
+                'spilled_bytes': self.spilled_frames * np.dtype(np.float32).itemsize,
+                'total_spills': self.total_spills,
+                'spill_errors': self.spill_errors,
+                'restore_errors': self.restore_errors,
+            }
+
+    def cleanup(self):
+        """退避用のディレクトリを削除する（キューを空にしてから呼ぶ。残っていた退避ファイルも消える）"""
+        with self.mutex:
+            if self.spill_dir is not None:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
+
+    def backlog(self):
+        """シーンごとの待ち区間数"""
+        with self.mutex:
+            return {scene: len(chunks) for scene, chunks in self.scenes.items()}
+
+    # 以下は queue.Queue の内部から mutex を持った状態で呼ばれる
+    def _init(self, maxsize):
+        # シーン名 -> 区間の deque。シーンは順に録音されるので、先頭のシーンほど古い区間を持つ
+        self.scenes = collections.OrderedDict()
+        self.frames = 0
+        self.memory_frames = 0      # メモリ上にある音声のサンプル数
+        self.spilled_chunks = 0     # ファイルに退避中の区間数
+        self.spilled_frames = 0
+        self.total_spills = 0
+        self.spill_errors = 0
+        self.restore_errors = 0
+
+    def _qsize(self):
+        return sum(len(chunks) for chunks in self.scenes.values())
+
+    def _put(self, chunk):
+        if isinstance(chunk.audio, SpilledAudio):
+            self.spilled_chunks += 1
+            self.spilled_frames += chunk.audio.size
+            self.total_spills += 1
+        else:
+            self.memory_frames += chunk.audio.size
+        self.scenes.setdefault(chunk.scene, collections.deque()).append(chunk)
+        self.frames += chunk.frames
+
+    def _get(self):
+        scene = self.current_scene() if self.policy == "current-first" else None
+        if scene not in self.scenes:
+            # 現在のシーンに待ちがなければ（fifo では常に）、いちばん古いシーンの残りを処理する
+            scene = next(iter(self.scenes))
+        chunks = self.scenes[scene]
+        chunk = chunks.popleft()
+        if not chunks:
+            del self.scenes[scene]
+        self.frames -= chunk.frames
+        if isinstance(chunk.audio, SpilledAudio):
+            self.spilled_chunks -= 1
+            self.spilled_frames -= chunk.audio.size
+        else:
+            self.memory_frames -= chunk.audio.size
+        return chunk
+
+    # 以下はロックを持たずに呼ぶ（ファイルの読み書き）
+    def _spill(self, chunk):
+        """区間の音声をファイルに書き出し、メモリ上の配列を手放す（失敗したらメモリに置いたままにする）"""
+        try:
+            if self.spill_dir is None:
+                self.spill_dir = tempfile.mkdtemp(prefix="mojiokoshi-spill-", dir=self.spill_root)
+            fd, path = tempfile.mkstemp(suffix=".f32", dir=self.spill_dir)
+            os.close(fd)
+            mapped = np.memmap(path, dtype=np.float32, mode="w+", shape=chunk.audio.shape)
+            mapped[:] = chunk.audio
+            mapped.flush()
+            del mapped
+        except Exception as e:
+            with self.mutex:
+                self.spill_errors += 1
+            print(f"⚠️ 音声区間をディスクに退避できませんでした（メモリに保持します）: {e}")
+            return
+        chunk.audio = SpilledAudio(path, chunk.audio.shape)
+
+    def _restore(self, chunk):
+        """退避した音声をメモリに読み戻してファイルを削除する。読み戻せなかったら False"""
+        spilled = chunk.audio
+        try:
+            mapped = np.memmap(spilled.path, dtype=np.float32, mode="r", shape=spilled.shape)
+            chunk.audio = np.array(mapped)
+            del mapped
+        except Exception as e:
+            with self.mutex:
+                self.restore_errors += 1
+            print(f"⚠️ 退避した音声区間を読み戻せませんでした（{chunk.scene} の位置 {chunk.start}〜{chunk.end} は"
+                  f"文字起こしできません）: {e}")
+            return False
+        with contextlib.suppress(OSError):
+            os.remove(spilled.path)
+        return True
+
+
+class SpilledAudio:
+    """ファイルに退避中の区間の音声（ChunkScheduler から取り出すときに配列に戻る）"""
+
+    def __init__(self, path, shape):
+        self.path = path
+        self.shape = shape
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
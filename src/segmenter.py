@@ -0,0 +1,351 @@
+import collections
+import threading
+import numpy as np
+from ring_buffer import AudioRingBuffer
+from resampler import StreamingResampler
+
+
+# 文字起こしするレーン: (レーン名, 使うチャンネル)。レーン名 None は全チャンネルを混ぜたもの
+LANES = {
+    "mixed": [(None, None)],
+    # Ch 0: マイク、Ch 1 以降: 仮想 (リモート) の L/R
+    "split": [("mic", slice(0, 1)), ("remote", slice(1, None))],
+}
+LANE_BUFFER_MARGIN_SEC = 5.0  # レーンのバッファの余裕（変換の端数など）
+
+
+def downmix(views, channels=None):
+    """リングバッファのビューを（channels のチャンネルだけ）モノラルに変換（ここで初めてコピーが発生する）"""
+    if channels is not None:
+        views = [view[:, channels] for view in views]
+    parts = [view.mean(axis=1) if view.ndim > 1 else view.ravel() for view in views]
+    if not parts:
+        return np.zeros(0, dtype=np.float32)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class AudioChunk:
+    """
+    文字起こし単位の音声（モノラル）。シーン名と録音開始からの位置 [start, end) を持つ。
+    lane はどの音源か（"mic"、"remote"、全チャンネルを混ぜた場合は None）
+    overlap > 0 の場合、audio の先頭 overlap サンプルは前の区間の末尾と重なっている（[start - overlap, end) の音声）
+    """
+
+    def __init__(self, scene, start, end, audio, lane=None, overlap=0):
+        self.scene = scene
+        self.start = start
+        self.end = end
+        self.audio = audio
+        self.lane = lane
+        self.overlap = overlap
+
+    @property
+    def frames(self):
+        return self.end - self.start
+
+
+class _Lane:
+    """レーンごとの変換と区間検出の状態"""
+
+    def __init__(self, name, channels, vad, buffer, resampler):
+        self.name = name
+        self.channels = channels
+        self.vad = vad
+        self.buffer = buffer          # 目標サンプルレートに変換済みのモノラル音声
+        self.resampler = resampler    # 録音レートと目標レートが同じ場合は None
+        self.segment_start = None     # 開いている区間の開始位置
+        self.last_speech_end = None
+        self.last_pause = None        # 区間内で最後に無音だった位置（最大長での分割用）
+        self.floor = 0                # 次の区間が遡れる下限（前の区間の終端やシーン境界）
+        self.previous_end = None      # 同じシーンで直前に送り出した区間の終端（重なりを付けるかの判断用）
+        self.skip_start = 0           # まだ on_skip で知らせていない無音の開始位置
+        self.emitted_frames = 0
+        self.segments = 0
+
+    def done_position(self, position):
+        """このレーンで処理済み（送り出し済みかスキップ済み）の位置"""
+        segment_start = self.segment_start
+        return segment_start if segment_start is not None else position
+
+    def audio(self, start, end):
+        """変換済みの音声 [start, end) を返す（折り返さない場合はコピーしない）"""
+        parts = [view[:, 0] for view in self.buffer.views(start, end)]
+        if not parts:
+            return np.zeros(0, dtype=np.float32)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class VadSegmenter:
+    """
+    audio_callback と transcribe_worker の間で音声区間を切り出すステージ。
+    - リングバッファの唯一の読み出し側として専用スレッドで動く
+    - 読み出したデータはレーンごとにモノラル化し、録音レートから sample_rate へ一度だけ変換する
+      （StreamingResampler が状態を持ち越すのでブロックの境目で途切れない。レートが同じなら変換しない）
+    - 発話の切れ目（min_silence_sec 以上の無音）で区間を閉じる。区間長は min/max の範囲に収める
+    - 無音だけの部分は文字起こしに回さず、スキップした時間を数える。
+      on_skip(scene, lane, start, end) を指定すると、スキップした範囲を次の区間の開始時・シーン切り替え時・終了時
+      （無音が skip_report_sec 以上続く場合はその途中でも）に知らせる
+    - vad が None の場合は max_segment_sec ごとの固定長で区切る（従来の動作）
+    - シーン切り替え位置では必ず区間を閉じ、区間にはその時点のシーン名を付ける
+    - lanes を複数指定するとレーン（マイク/リモートなど）ごとに独立して区間を検出する。
+      レーンごとに別の VAD を使うので、無音のレーンは文字起こしに回らない
+    - 発話の途中で区切った（前の区間とすき間なく続く）区間には、前の区間の末尾 overlap_sec 秒を重ねて付ける。
+      重なりの音声はレーンのバッファに残しておき、区間を送り出すときのコピーにそのまま含める
+    区間の位置 (AudioChunk.start/end) は sample_rate でのサンプル位置。
+    レーンのバッファ（lane_buffer_sec、None: 自動）には、開いている最長の区間（max_segment_sec）と重なり・余白に加えて、
+    一度に変換するリングバッファ1杯分が入る必要がある。足りない指定は作成時に ValueError にする。
+    """
+
+    def __init__(self, ring_buffer, emit, sample_rate, vad=None, min_segment_sec=5.0, max_segment_sec=60.0,
+                 min_silence_sec=0.5, max_silence_sec=2.0, speech_pad_sec=0.2, scene="default",
+                 lanes=None, vad_factory=None, capture_rate=None, lane_buffer_sec=None, overlap_sec=0.0,
+                 on_skip=None, skip_report_sec=30.0):
+        self.ring_buffer = ring_buffer
+        self.emit = emit
+        self.on_skip = on_skip
+        self.skip_report = int(skip_report_sec * sample_rate)
+        self.sample_rate = sample_rate
+        self.capture_rate = capture_rate or sample_rate
+        self.min_segment = int(min_segment_sec * sample_rate)
+        self.max_segment = int(max_segment_sec * sample_rate)
+        self.min_silence = int(min_silence_sec * sample_rate)
+        self.max_silence = int(max_silence_sec * sample_rate)
+        self.pad = int(speech_pad_sec * sample_rate)
+        self.overlap = int(overlap_sec * sample_rate)
+        self.scene = scene
+
+        # 解放できない範囲（開いている区間と重なり・余白）＋まだ解析していない変換済みのデータ（リングバッファ1杯分まで）
+        needed_sec = (max_segment_sec + overlap_sec + speech_pad_sec
+                      + ring_buffer.capacity / self.capture_rate + LANE_BUFFER_MARGIN_SEC)
+        if lane_buffer_sec is None:
+            lane_buffer_sec = needed_sec
+        elif lane_buffer_sec < needed_sec:
+            raise ValueError(f"レーンのバッファ ({lane_buffer_sec}秒) が足りません。区間の最大長などから {needed_sec:.1f}秒以上必要です")
+
+        lanes = lanes or LANES["mixed"]
+        if len(lanes) > 1 and vad_factory is None:
+            raise ValueError("複数レーンにはレーンごとの VAD を作る vad_factory が必要です")
+        self.lanes = []
+        for name, channels in lanes:
+            resampler = None
+            if self.capture_rate != sample_rate:
+                resampler = StreamingResampler(self.capture_rate, sample_rate)
+            buffer = AudioRingBuffer(int(lane_buffer_sec * sample_rate), 1)
+            self.lanes.append(_Lane(name, channels, vad_factory() if vad_factory else vad, buffer, resampler))
+        self.capture_start = ring_buffer.read_position  # 録音位置の基準（リングバッファは使い回されるため）
+        self.position = 0                               # 次に解析する位置（変換後）
+        vad = self.lanes[0].vad
+        self.frame_size = vad.frame_size if vad is not None else int(0.03 * sample_rate)
+        self.total_frames = 0
+
+        self._cuts = collections.deque()
+        self._wakeup = threading.Event()
+        self._flushing = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def notify(self):
+        """新しいデータが書き込まれたことを知らせる（audio_callback から呼ぶ）"""
+        self._wakeup.set()
+
+    def cut_scene(self, capture_position, scene):
+        """
+        リングバッファの位置 capture_position 以降のデータを scene として扱う（その位置で区間を閉じる）
+        """
+        position = capture_position - self.capture_start
+        resampler = self.lanes[0].resampler
+        if resampler is not None:
+            position = resampler.output_position(position)
+        self._cuts.append((position, scene))
+        self._wakeup.set()
+
+    def process(self):
+        """スレッドを使わない場合（録音ファイルからの処理など）に、書き込み済みのデータを処理する"""
+        self._process()
+
+    def flush(self):
+        """書き込み済みのデータをすべて処理し、開いている区間を閉じてスレッドを終了する"""
+        self._flushing.set()
+        self._wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        else:
+            self._process(final=True)
+
+    def to_seconds(self, position):
+        return position / self.sample_rate
+
+    def pending_frames(self):
+        """まだ区間として送り出しておらず、スキップもしていないフレーム数（録音レート）"""
+        unconverted = self.ring_buffer.available()
+        position = self.position
+        done = min(lane.done_position(position) for lane in self.lanes)
+        converted = self.lanes[0].buffer.write_position - done
+        return unconverted + converted * self.capture_rate // self.sample_rate
+
+    def skipped_frames(self, lane=None):
+        """無音として文字起こしせずに捨てたフレーム数（lane 省略時は全レーンの合計）"""
+        lanes = self.lanes if lane is None else [lane]
+        position = self.position
+        skipped = 0
+        for lane in lanes:
+            open_frames = position - lane.done_position(position)
+            skipped += self.total_frames - lane.emitted_frames - open_frames
+        return skipped
+
+    def stats(self):
+        """統計情報（秒数は全レーンの合計）"""
+        lanes = {
+            lane.name or "mixed": {
+                'segments': lane.segments,
+                'emitted_sec': lane.emitted_frames / self.sample_rate,
+                'skipped_sec': self.skipped_frames(lane) / self.sample_rate,
+            }
+            for lane in self.lanes
+        }
+        return {
+            'segments': sum(lane.segments for lane in self.lanes),
+            'total_sec': self.total_frames * len(self.lanes) / self.sample_rate,
+            'emitted_sec': sum(lane.emitted_frames for lane in self.lanes) / self.sample_rate,
+            'skipped_sec': self.skipped_frames() / self.sample_rate,
+            'lanes': lanes,
+        }
+
+    def _run(self):
+        while True:
+            final = self._flushing.is_set()
+            try:
+                self._process(final=final)
+            except Exception as e:
+                print(f"音声区間の切り出し中にエラー: {e}")
+            if final:
+                break
+            self._wakeup.wait(timeout=0.5)
+            self._wakeup.clear()
+
+    def _convert(self, final=False):
+        """リングバッファの新しいデータをレーンごとにモノラル化・変換してレーンのバッファに移す"""
+        start = self.ring_buffer.read_position
+        end = self.ring_buffer.write_position
+        if end <= start and not final:
+            return
+        views = self.ring_buffer.views(start, end)
+        for lane in self.lanes:
+            mono = downmix(views, lane.channels)
+            if lane.resampler is not None:
+                mono = lane.resampler.process(mono, final=final)
+            if mono.size and lane.buffer.write(mono[:, None]) == 0:
+                print(f"⚠️ 区間切り出しのバッファが満杯のため {mono.size} サンプルを破棄しました")
+        self.ring_buffer.release(end)
+
+    def _process(self, final=False):
+        self._convert(final)
+        end = self.lanes[0].buffer.write_position
+        while True:
+            cut = self._cuts[0] if self._cuts else None
+            if cut is not None and (cut[0] <= end or final):
+                limit = min(max(cut[0], self.position), end)
+            else:
+                cut = None
+                limit = end
+                if not final:
+                    # 解析フレーム単位で処理し、端数は次回に回す
+                    limit = self.position + (limit - self.position) // self.frame_size * self.frame_size
+            if limit > self.position:
+                self._analyze(self.position, limit)
+            if cut is None:
+                break
+            # シーン切り替え位置で区間を閉じる
+            self._cuts.popleft()
+            for lane in self.lanes:
+                self._close_segment(lane, self.position)
+                lane.floor = self.position
+                lane.previous_end = None  # シーンをまたいでは重ねない
+            self.scene = cut[1]
+        if final:
+            for lane in self.lanes:
+                self._close_segment(lane, self.position)
+        self._release()
+
+    def _analyze(self, start, end):
+        count = -(-(end - start) // self.frame_size)
+        for lane in self.lanes:
+            if lane.vad is None:
+                mask = np.ones(count, dtype=bool)
+            else:
+                mask = lane.vad.speech_mask(lane.audio(start, end))
+                if mask.size < count:
+                    # 端数のフレームは無音として扱う
+                    mask = np.append(mask, False)
+            self._advance(lane, start, end, mask)
+            if lane.segment_start is None and end - lane.skip_start >= self.skip_report:
+                self._skip(lane, end)
+        self.total_frames += end - start
+        self.position = end
+
+    def _advance(self, lane, start, end, mask):
+        for i, speech in enumerate(mask):
+            frame_start = start + i * self.frame_size
+            frame_end = min(frame_start + self.frame_size, end)
+            if speech:
+                if lane.segment_start is None:
+                    lane.segment_start = max(frame_start - self.pad, lane.floor, lane.buffer.read_position)
+                    self._skip(lane, lane.segment_start)
+                lane.last_speech_end = frame_end
+            elif lane.segment_start is not None:
+                silence = frame_end - lane.last_speech_end
+                if lane.last_speech_end - lane.segment_start >= self.min_segment:
+                    lane.last_pause = frame_end
+                if (silence >= self.min_silence and lane.last_speech_end - lane.segment_start >= self.min_segment) \
+                        or silence >= self.max_silence:
+                    self._close_segment(lane, min(lane.last_speech_end + self.pad, frame_end))
+                    continue
+            if lane.segment_start is not None and frame_end - lane.segment_start >= self.max_segment:
+                # 最大長に達したら、区間内の最後の無音位置（なければ現在位置）で分割して続ける
+                split = lane.last_pause if lane.last_pause is not None else frame_end
+                self._close_segment(lane, split)
+                if split < frame_end and lane.last_speech_end > split:
+                    lane.segment_start = split
+
+    def _close_segment(self, lane, end):
+        start = lane.segment_start
+        lane.segment_start = None
+        lane.last_pause = None
+        if start is None:
+            self._skip(lane, end)  # シーン切り替えや終了の位置まで無音だった
+            return
+        if end <= start:
+            return
+        overlap = 0
+        if start == lane.previous_end:
+            overlap = max(min(self.overlap, start - lane.buffer.read_position), 0)
+        # レーンのバッファは再利用されるので、送り出す区間はコピーする（重なり部分も同じコピーに含める）
+        audio = np.array(lane.audio(start - overlap, end), dtype=np.float32)
+        lane.segments += 1
+        lane.emitted_frames += end - start
+        lane.floor = end
+        lane.previous_end = end
+        lane.skip_start = end
+        self.emit(AudioChunk(self.scene, start, end, audio, lane=lane.name, overlap=overlap))
+
+    def _skip(self, lane, end):
+        """lane.skip_start から end までを無音としてスキップしたことを知らせる"""
+        if end > lane.skip_start and self.on_skip is not None:
+            try:
+                self.on_skip(self.scene, lane.name, lane.skip_start, end)
+            except Exception as e:
+                print(f"スキップした範囲の通知エラー: {e}")
+        lane.skip_start = max(lane.skip_start, end)
+
+    def _release(self):
+        """レーンごとに不要になった範囲を解放する（発話直前の余白分と、次の区間に重ねる分は残す）"""
+        for lane in self.lanes:
+            if lane.segment_start is not None:
+                target = lane.segment_start - self.overlap
+            else:
+                target = max(lane.floor - self.overlap, self.position - self.pad)
+            lane.buffer.release(min(max(target, lane.buffer.read_position), self.position))
@@ -0,0 +1,147 @@
+import numpy as np
+
+SENTENCE_TERMINATORS = ("。", "！", "？", ".", "!", "?")
+
+
+def tokenize(text, spaced):
+    """比較用にテキストを分割（空白区切りの言語は単語、それ以外は文字単位）"""
+    if spaced:
+        return text.split()
+    return [char for char in text if not char.isspace()]
+
+
+def join_tokens(tokens, spaced):
+    return " ".join(tokens) if spaced else "".join(tokens)
+
+
+def common_prefix_length(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class StreamingTranscriber:
+    """
+    短いスライディング窓を繰り返し文字起こしする低遅延モード。
+    - 窓の先頭は「確定済みの区切り」で、窓が window_sec を超えたら確定済みのセグメント境界で切り詰める
+    - 連続する2回の仮説で一致した先頭部分だけを確定する（local agreement）
+    - on_tentative(scene, text): 未確定テキスト（確定済みで行にまとまっていない分を含む）の更新
+    - on_commit(scene, text): 文末などでまとまった確定テキスト
+    """
+
+    def __init__(self, transcribe, on_commit, on_tentative, sample_rate, language,
+                 step_sec=1.5, window_sec=12.0, max_line_chars=200):
+        self.transcribe = transcribe
+        self.on_commit = on_commit
+        self.on_tentative = on_tentative
+        self.sample_rate = sample_rate
+        self.spaced = language not in ("ja", "zh")
+        self.step = int(step_sec * sample_rate)
+        self.window = int(window_sec * sample_rate)
+        self.max_line_chars = max_line_chars
+
+        self.scene = None
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_end = None         # バッファ末尾の録音位置（途切れの検出用）
+        self.new_samples = 0           # 前回の文字起こし以降に追加されたサンプル数
+        self.committed_in_buffer = []  # バッファ先頭から確定済みのトークン
+        self.previous = []             # 前回の仮説（確定済み部分を除く）
+        self.line = []                 # 確定済みだがまだ on_commit していないトークン
+        self.prompt = ""
+
+    def feed(self, chunk, audio, decode=True):
+        """
+        前処理済みの音声区間を追加する。
+        区間が前の区間と連続していない（無音で区切られた、シーンが変わった）場合は確定してから始め直す。
+        decode=False の場合は追加のみ行う（処理が遅れているときに使う）
+        """
+        if self.scene is not None and (chunk.scene != self.scene or chunk.start != self.buffer_end):
+            self.finalize()
+        self.scene = chunk.scene
+        self.buffer = np.concatenate((self.buffer, audio)) if self.buffer.size else audio
+        self.buffer_end = chunk.end
+        self.new_samples += audio.size
+        if decode and self.new_samples >= self.step:
+            self._decode()
+
+    def finalize(self):
+        """バッファに残った仮説をすべて確定して出力し、状態を初期化する"""
+        if self.new_samples and self.buffer.size:
+            self._decode()
+        self.line.extend(self.previous)
+        self._flush_line(force=True)
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_end = None
+        self.new_samples = 0
+        self.committed_in_buffer = []
+        self.previous = []
+        self.scene = None
+
+    def _decode(self):
+        self.new_samples = 0
+        result = self.transcribe(self.buffer, self.prompt)
+        segments = result.get("segments") or []
+        hypothesis = tokenize(result.get("text", ""), self.spaced)
+
+        # 確定済みの分を除いた仮説と、前回の仮説との共通部分を確定
+        current = hypothesis[len(self.committed_in_buffer):]
+        agreed = common_prefix_length(self.previous, current)
+        if agreed:
+            self.committed_in_buffer.extend(current[:agreed])
+            self.line.extend(current[:agreed])
+        self.previous = current[agreed:]
+        self._flush_line()
+        self._publish_tentative()
+        self._trim(segments)
+
+    def _trim(self, segments):
+        """窓が長くなったら、確定済みのセグメントの終端までバッファを切り詰める"""
+        if self.buffer.size <= self.window:
+            return
+        consumed = 0
+        cut_sec = None
+        cut_tokens = 0
+        for segment in segments:
+            consumed += len(tokenize(segment.get("text", ""), self.spaced))
+            if consumed > len(self.committed_in_buffer):
+                break
+            cut_sec, cut_tokens = segment.get("end"), consumed
+        if cut_sec:
+            cut = min(int(cut_sec * self.sample_rate), self.buffer.size)
+            self.buffer = self.buffer[cut:].copy()
+            self.committed_in_buffer = self.committed_in_buffer[cut_tokens:]
+        elif self.buffer.size > 2 * self.window:
+            # 区切れる位置が見つからないまま長くなりすぎた場合は、すべて確定して始め直す
+            self.line.extend(self.previous)
+            self._flush_line(force=True)
+            self.buffer = np.zeros(0, dtype=np.float32)
+            self.committed_in_buffer = []
+            self.previous = []
+            self._publish_tentative()
+
+    def _flush_line(self, force=False):
+        """確定トークンを文末（または長さの上限）までまとめて on_commit する"""
+        if not self.line:
+            if force:
+                self._publish_tentative()
+            return
+        cut = 0
+        for i, token in enumerate(self.line):
+            if token.endswith(SENTENCE_TERMINATORS):
+                cut = i + 1
+        text = join_tokens(self.line, self.spaced)
+        if force or len(text) >= self.max_line_chars:
+            cut = len(self.line)
+        if cut:
+            committed = join_tokens(self.line[:cut], self.spaced)
+            self.line = self.line[cut:]
+            self.prompt = committed[-200:]
+            self.on_commit(self.scene, committed)
+            if force:
+                self._publish_tentative()
+
+    def _publish_tentative(self):
+        text = join_tokens(self.line + self.previous, self.spaced)
+        self.on_tentative(self.scene, text)
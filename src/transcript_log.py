@@ -0,0 +1,142 @@
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from metrics import LatencyStats
+
+FORMATS = ("text", "jsonl")
+
+
+class TranscriptLog:
+    """
+    文字起こし結果の即時ログを専用スレッドで書き込む。
+    - ファイルは start() から close() まで開いたまま、バッファ付きで書き込む
+    - write() はキューに入れるだけなので、文字起こしのループがファイル I/O で止まらない
+    - flush_every 件ごと、または flush_sec 秒ごとにフラッシュする（fsync=True ならディスクまで同期する）
+    - 記録はシーン、レーン、録音開始からの位置（秒）、文字起こしにかかった時間を持つ
+      format="jsonl" では1行1レコードの JSON、"text" では人が読みやすい1行
+    """
+
+    def __init__(self, path, flush_every=10, flush_sec=5.0, fsync=False, format="jsonl"):
+        if format not in FORMATS:
+            raise ValueError(f"不明なログ形式です: {format} (選択肢: {', '.join(FORMATS)})")
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_sec = flush_sec
+        self.fsync = fsync
+        self.format = format
+        self.file = None
+        self.thread = None
+        self._queue = queue.Queue()
+
+        # 統計情報
+        self.records_written = 0
+        self.flushes = 0
+        self.write_errors = 0
+        self.write_latency = LatencyStats()  # write() からファイルに書き込むまでの時間（キューでの待ちを含む）
+
+    def start(self, header=None, append=False):
+        """ファイルを開いて書き込みスレッドを開始（append=True なら既存のファイルに追記する）"""
+        self.file = open(self.path, "a" if append else "w", encoding="utf-8")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if header:
+            self.write_note(header)
+
+    def write(self, text, scene=None, lane=None, start_sec=None, end_sec=None, processing_sec=None, model=None):
+        """文字起こし結果を1件記録する（どのスレッドからでも呼べる）"""
+        self.write_record({
+            'scene': scene,
+            'lane': lane,
+            'start_sec': start_sec,
+            'end_sec': end_sec,
+            'processing_sec': processing_sec,
+            'model': model,
+            'text': text,
+        })
+
+    def write_note(self, note):
+        """録音開始・停止などの区切りを記録する"""
+        self.write_record({'note': note})
+
+    def write_record(self, record):
+        """任意の項目を持つレコードを記録する（format="jsonl" 用）"""
+        record = dict({'time': datetime.datetime.now().isoformat(timespec="milliseconds")}, **record)
+        self._queue.put((time.perf_counter(), record))
+
+    def backlog(self):
+        """まだ書き込まれていない件数"""
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            'records_written': self.records_written,
+            'flushes': self.flushes,
+            'backlog': self.backlog(),
+            'write_errors': self.write_errors,
+            'write_latency_avg_sec': self.write_latency.total / self.write_latency.count if self.write_latency.count else 0.0,
+            'write_latency_max_sec': self.write_latency.max,
+        }
+
+    def format_record(self, record):
+        if self.format == "jsonl":
+            return json.dumps(record, ensure_ascii=False)
+        if 'note' in record:
+            return f"\n--- {record['note']} ---"
+        position = ""
+        if record['start_sec'] is not None:
+            position = f" {record['start_sec']:.1f}-{record['end_sec']:.1f}s"
+        return f"[{record['scene']}{position}] {record['text']}"
+
+    def _flush(self):
+        try:
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.flushes += 1
+        except Exception as e:
+            self.write_errors += 1
+            print(f"即時ログのフラッシュエラー: {e}")
+
+    def _run(self):
+        unflushed = 0
+        last_flush = 0.0
+        while True:
+            timeout = max(self.flush_sec - (time.monotonic() - last_flush), 0) if unflushed else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ...  # フラッシュの時間になった
+            if item is None:
+                break
+            if item is not ...:
+                queued_at, record = item
+                try:
+                    self.file.write(self.format_record(record) + "\n")
+                    self.write_latency.observe(time.perf_counter() - queued_at)
+                    self.records_written += 1
+                    if not unflushed:
+                        last_flush = time.monotonic()  # flush_sec は未フラッシュの最初の記録から数える
+                    unflushed += 1
+                except Exception as e:
+                    self.write_errors += 1
+                    print(f"即時ログへの書き込みエラー: {e}")
+            if unflushed and (unflushed >= self.flush_every or time.monotonic() - last_flush >= self.flush_sec):
+                self._flush()
+                unflushed = 0
+                last_flush = time.monotonic()
+        self._flush()
+
+    def close(self, footer=None):
+        """残りを書き出してファイルを閉じる"""
+        if footer:
+            self.write_note(footer)
+        self._queue.put(None)
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class EnergyVAD:
+    """
+    エネルギーとゼロ交差率による簡易な音声区間検出。
+    - 解析フレームごとの判定はまとめてベクトル演算で行う
+    - ノイズフロアは threshold_db - margin_db から始め、ブロックごとの静かなフレーム（下位10%）に追従させる。
+      下がるときは1ブロックあたり差の1割ずつ追従し、上がるときは解析した音声1秒あたり noise_rise_db_per_sec までにする
+      （話し始めから録音した場合も、話し声の大きさをノイズとみなさない）
+    """
+
+    def __init__(self, sample_rate, frame_sec=0.03, threshold_db=-45.0, margin_db=10.0, zcr_threshold=0.25,
+                 noise_rise_db_per_sec=1.0):
+        self.sample_rate = sample_rate
+        self.frame_size = int(frame_sec * sample_rate)
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.zcr_threshold = zcr_threshold
+        self.noise_rise_db_per_sec = noise_rise_db_per_sec
+        self.noise_floor_db = None
+
+    def speech_mask(self, mono):
+        """mono (frame_size の整数倍) をフレームに分けて、音声フレームなら True の配列を返す"""
+        frames = mono[:len(mono) // self.frame_size * self.frame_size].reshape(-1, self.frame_size)
+        if frames.shape[0] == 0:
+            return np.zeros(0, dtype=bool)
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        level_db = 20.0 * np.log10(rms + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_size
+
+        if self.noise_floor_db is None:
+            self.noise_floor_db = self.threshold_db - self.margin_db
+        threshold = max(self.threshold_db, self.noise_floor_db + self.margin_db)
+        # 有声音はエネルギーで、無声の摩擦音はやや低いエネルギー＋高いゼロ交差率で拾う
+        mask = (level_db > threshold) | ((level_db > threshold - 6.0) & (zcr > self.zcr_threshold))
+
+        quiet = float(np.percentile(level_db, 10))
+        if quiet < self.noise_floor_db:
+            self.noise_floor_db = 0.9 * self.noise_floor_db + 0.1 * quiet
+        else:
+            block_sec = frames.shape[0] * self.frame_size / self.sample_rate
+            self.noise_floor_db += min(quiet - self.noise_floor_db, self.noise_rise_db_per_sec * block_sec)
+        return mask
+
+    def reset(self):
+        self.noise_floor_db = None
+
+
+class SileroVAD:
+    """
+    Silero VAD (silero-vad パッケージ) によるモデルベースの音声区間検出。
+    16kHz では 512 サンプル単位で判定する。
+    """
+
+    def __init__(self, sample_rate, threshold=0.5):
+        from silero_vad import load_silero_vad
+        import torch
+        self._torch = torch
+        self.model = load_silero_vad()
+        self.sample_rate = sample_rate
+        self.frame_size = 512 if sample_rate == 16000 else 256
+        self.threshold = threshold
+
+    def speech_mask(self, mono):
+        count = len(mono) // self.frame_size
+        mask = np.zeros(count, dtype=bool)
+        with self._torch.no_grad():
+            for i in range(count):
+                frame = self._torch.from_numpy(np.ascontiguousarray(mono[i * self.frame_size:(i + 1) * self.frame_size]))
+                mask[i] = self.model(frame, self.sample_rate).item() >= self.threshold
+        return mask
+
+    def reset(self):
+        self.model.reset_states()
+
+
+def create_vad(mode, sample_rate):
+    """
+    VADを作成する。
+    - "energy": EnergyVAD
+    - "silero": SileroVAD（silero-vad が無い場合は EnergyVAD にフォールバック）
+    - None: VADを使わない（固定長で区切る）
+    """
+    if mode is None:
+        return None
+    if mode == "silero":
+        try:
+            return SileroVAD(sample_rate)
+        except ImportError as e:
+            print(f"Silero VADを読み込めないためエネルギー方式を使用します: {e}")
+            return EnergyVAD(sample_rate)
+    if mode == "energy":
+        return EnergyVAD(sample_rate)
+    raise ValueError(f"不明なVADモードです: {mode}")
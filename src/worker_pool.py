@@ -0,0 +1,101 @@
+"""
+複数プロセスでの文字起こし。
+
+各ワーカープロセスが自分のモデルを持ち、区間を並列に文字起こしする。
+結果は完了順に返ってくるので、ReorderBuffer で録音順に並べ直してから反映する。
+"""
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+import numpy as np
+from backends import create_backend
+
+# ワーカープロセス内のエンジン
+_worker_backend = None
+_worker_language = None
+
+
+def configure_threads(threads):
+    """推論ライブラリが使うスレッド数を設定（ワーカー数 × スレッド数 ≒ コア数 にする）"""
+    if not threads:
+        return
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _init_worker(backend_name, model_size, options, language, threads):
+    global _worker_backend, _worker_language
+    configure_threads(threads)
+    if backend_name == "faster-whisper" and threads:
+        options = dict(options, cpu_threads=threads)
+    _worker_backend = create_backend(backend_name, model_size, **options)
+    _worker_language = language
+
+
+def _transcribe(audio, options):
+    return _worker_backend.transcribe(audio, _worker_language, **options)
+
+
+def _warmup(samples):
+    _worker_backend.transcribe(np.zeros(samples, dtype=np.float32), _worker_language)
+    return os.getpid()
+
+
+class TranscriptionPool:
+    """
+    文字起こしワーカープロセスのプール。
+    transcribe() はエンジンと同じ形で呼べる（結果を待つ）。非同期にしたい場合は submit() を使う。
+    """
+
+    name = "pool"
+
+    def __init__(self, backend_name, model_size, options, language, workers, threads=None):
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.language = language
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend_name, model_size, dict(options), language, self.threads),
+        )
+
+    def warm_up(self, samples):
+        """全ワーカーを起動してモデルを読み込ませ、一度推論させる"""
+        futures = [self.executor.submit(_warmup, samples) for _ in range(self.workers)]
+        done, _ = wait(futures)
+        pids = {future.result() for future in done}
+        print(f"文字起こしワーカー {len(pids)}/{self.workers} プロセス準備完了 (各 {self.threads} スレッド)")
+
+    def submit(self, audio, **options):
+        """区間の文字起こしを投入し、Future を返す"""
+        return self.executor.submit(_transcribe, audio, options)
+
+    def transcribe(self, audio, language, **options):
+        if language != self.language:
+            raise ValueError(f"ワーカーの言語設定 ({self.language}) と異なります: {language}")
+        return self.submit(audio, **options).result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ReorderBuffer:
+    """連番付きで届く結果を受け取り、連番の順に取り出せるものを返す"""
+
+    def __init__(self, first=0):
+        self.next_seq = first
+        self.pending = {}
+
+    def add(self, seq, item):
+        self.pending[seq] = item
+        ready = []
+        while self.next_seq in self.pending:
+            ready.append(self.pending.pop(self.next_seq))
+            self.next_seq += 1
+        return ready